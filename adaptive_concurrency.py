@@ -0,0 +1,140 @@
+from __future__ import annotations
+import importlib
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+def _optional_types(module_name, *names):
+    """Classes de exceção de um SDK opcional; tupla vazia se o pacote não estiver instalado."""
+    try:
+        module = importlib.import_module(module_name)
+    except Exception:
+        return ()
+    return tuple(t for t in (getattr(module, n, None) for n in names) if isinstance(t, type))
+
+
+# Exceções que os SDKs usam para saturação do provedor (limite de taxa, 5xx, prazo esgotado)
+THROTTLE_EXCEPTIONS = (
+    _optional_types("openai", "RateLimitError", "APITimeoutError", "InternalServerError")
+    + _optional_types("openai.error", "RateLimitError", "Timeout", "ServiceUnavailableError")
+    + _optional_types("google.api_core.exceptions", "TooManyRequests", "ResourceExhausted",
+                      "ServiceUnavailable", "DeadlineExceeded", "InternalServerError")
+)
+
+# Último recurso para exceções sem status nem tipo conhecido: só códigos HTTP explícitos
+_THROTTLE_ERROR = re.compile(r"\b429\b|\b5\d\d\b|resource[_ ]?exhausted|too many requests", re.IGNORECASE)
+
+
+def _http_status(error: BaseException) -> Optional[int]:
+    for attr in ("status_code", "http_status", "code"):
+        status = getattr(error, attr, None)
+        if isinstance(status, int) and 100 <= status < 600:
+            return status
+    return None
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    """True para 429, 5xx e timeouts, os sinais de que o provedor está saturado.
+
+    O status HTTP decide quando existe: um 400/403 (cota de projeto não configurada, modelo
+    indisponível na região) é erro permanente do cliente e não deve reduzir a janela.
+    """
+    status = _http_status(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    if THROTTLE_EXCEPTIONS and isinstance(error, THROTTLE_EXCEPTIONS):
+        return True
+    if isinstance(error, TimeoutError):
+        return True
+    return bool(_THROTTLE_ERROR.search(str(error)))
+
+
+class AIMDController:
+    """Janela de requisições simultâneas ajustada por AIMD (aumento aditivo, redução multiplicativa).
+
+    A cada sucesso saudável a janela cresce 1/janela (≈ +1 por janela completa). Um 429, 5xx,
+    timeout ou latência acima de `spike_factor` vezes a latência de referência reduz a janela
+    por `decrease_factor`, no máximo uma vez por intervalo de latência, para que uma onda de
+    falhas simultâneas conte como um único sinal.
+    """
+
+    def __init__(self, maximum: int, minimum: int = 1, initial: Optional[int] = None,
+                 decrease_factor: float = 0.5, spike_factor: float = 2.0, ewma_alpha: float = 0.2):
+        self.maximum = max(1, int(maximum))
+        self.minimum = max(1, min(int(minimum), self.maximum))
+        start = self.minimum if initial is None else int(initial)
+        self._window = float(min(max(start, self.minimum), self.maximum))
+        self.decrease_factor = decrease_factor
+        self.spike_factor = spike_factor
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+        self._ewma: Optional[float] = None
+        self._baseline: Optional[float] = None
+        self._last_decrease = 0.0
+        self._peak = int(self._window)
+        self._increases = 0
+        self._decreases = 0
+        self._throttles = 0
+        self._spikes = 0
+        self._successes = 0
+
+    @property
+    def limit(self) -> int:
+        with self._lock:
+            return int(self._window)
+
+    def _decrease(self, now: float) -> bool:
+        # Uma redução por "ida e volta": falhas de chamadas já em voo contam como um único sinal
+        cooldown = self._ewma if self._ewma is not None else 1.0
+        if now - self._last_decrease < cooldown:
+            return False
+        self._window = max(float(self.minimum), self._window * self.decrease_factor)
+        self._last_decrease = now
+        self._decreases += 1
+        return True
+
+    def record(self, latency: float, error: Optional[BaseException] = None) -> None:
+        """Registra o resultado de uma chamada ao provedor e ajusta a janela."""
+        now = time.monotonic()
+        with self._lock:
+            if error is not None:
+                if is_throttle_error(error):
+                    self._throttles += 1
+                    self._decrease(now)
+                return
+
+            self._successes += 1
+            self._ewma = latency if self._ewma is None else (
+                self.ewma_alpha * latency + (1 - self.ewma_alpha) * self._ewma)
+            if self._baseline is None or self._ewma < self._baseline:
+                self._baseline = self._ewma
+            else:
+                # Referência acompanha devagar uma lentidão persistente do provedor
+                self._baseline = 0.99 * self._baseline + 0.01 * self._ewma
+
+            if latency > self.spike_factor * self._baseline:
+                self._spikes += 1
+                self._decrease(now)
+                return
+
+            if self._window < self.maximum:
+                before = int(self._window)
+                self._window = min(float(self.maximum), self._window + 1.0 / self._window)
+                if int(self._window) > before:
+                    self._increases += 1
+                    self._peak = max(self._peak, int(self._window))
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "window": int(self._window),
+                "peak": self._peak,
+                "maximum": self.maximum,
+                "increases": self._increases,
+                "decreases": self._decreases,
+                "throttles": self._throttles,
+                "latency_spikes": self._spikes,
+                "ewma_latency": self._ewma,
+            }
@@ -1,12 +1,19 @@
 import google.generativeai as genai
+from google.generativeai import client as genai_client
 import os
 import sys
 import re
 import base64
+import io
 from pathlib import Path
 from PIL import Image
 import tempfile
 import logging
+import time
+import hashlib
+import threading
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 try:
     from openai import OpenAI
@@ -19,7 +26,7 @@ except ImportError:
     openai_legacy = None
 import cv2
 import csv
-from datetime import datetime
+from datetime import datetime, timedelta
 from dotenv import load_dotenv, find_dotenv, set_key
 import tkinter as tk
 from tkinter import filedialog
@@ -31,11 +38,46 @@ try:
 except Exception:
     export_from_rows = None
 
+# --- Catálogo persistente de metadados (SQLite) ---
+CATALOG = None
+try:
+    from metadata_catalog import MetadataCatalog
+except Exception:
+    MetadataCatalog = None
+
+# --- Arquivo de respostas brutas (reprocessamento offline) ---
+RESPONSE_ARCHIVE = None
+try:
+    from response_archive import ResponseArchive
+except Exception:
+    ResponseArchive = None
+
+# --- Profiling opcional (--profile) ---
+PROFILER = None
+try:
+    from run_profiler import RunProfiler
+except Exception:
+    RunProfiler = None
+
+# --- Ledger de cotas diárias por chave ---
+try:
+    from quota_ledger import QuotaLedger
+except Exception:
+    QuotaLedger = None
+
+# --- Concorrência adaptativa (AIMD) no envio de arquivos ---
+try:
+    from adaptive_concurrency import AIMDController
+except Exception:
+    AIMDController = None
+
 
 # --- Configuração Principal ---
 DEFAULT_GEMINI_MODEL = "gemini-2.5-flash-lite"
 DEFAULT_OPENAI_MODEL = "gpt-5-mini"
 DEFAULT_FOLDER_PATH = Path(r"")
+DEFAULT_CATALOG_PATH = Path(__file__).resolve().with_name("metadata_catalog.db")
+DEFAULT_QUOTA_LEDGER_PATH = Path(__file__).resolve().with_name("quota_ledger.json")
 SUPPORTED_PROVIDERS = {"gemini", "openai"}
 CATEGORIAS_ADOBE = {
     1: "Animals", 2: "Buildings and Architecture", 3: "Business", 4: "Drinks",
@@ -45,6 +87,13 @@ CATEGORIAS_ADOBE = {
     17: "Social Issues", 18: "Sports", 19: "Technology", 20: "Transport", 21: "Travel"
 }
 SUPPORTED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.mp4')
+DEFAULT_MAX_DECODE_MB = 512
+MAX_KEY_COOLDOWN_WAIT = 180  # segundos
+DEFAULT_PROMPT_CACHE_TTL = 3600  # segundos
+PROMPT_CACHE_REFRESH_MARGIN = 300  # renova o cache Gemini quando faltar menos que isso para expirar
+# Mínimo de tokens do prefixo para o cache explícito do Gemini 2.5 e o cache automático da OpenAI
+PROMPT_CACHE_MIN_TOKENS = 1024
+DEFAULT_MAX_CONCURRENCY = 1  # teto de arquivos enviados ao provedor ao mesmo tempo
 
 # --- System Prompt (em Inglês) ---
 system_prompt = f"""
@@ -83,6 +132,19 @@ Respond ONLY with the following XML format, with no other text before or after.
 </METADATA>
 """
 
+# --- Cache de prompt (opt-in via --prompt-cache) ---
+PROMPT_CACHE_ENABLED = False
+PROMPT_CACHE_KEY = "csvbrothers-" + hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+GEMINI_PROMPT_CACHE = None
+# Estimativa grosseira (~4 caracteres por token em inglês), suficiente para comparar com o mínimo
+PROMPT_ESTIMATED_TOKENS = len(system_prompt) // 4
+USAGE_TOTALS = {"requests": 0, "unreported": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0}
+_USAGE_LOCK = threading.Lock()
+
+# genai.configure é global: configurar e ligar o cliente ao modelo precisa ser atômico quando há workers em paralelo
+_GEMINI_CONFIG_LOCK = threading.Lock()
+_CSV_LOCK = threading.Lock()
+
 # --- Funções do Script ---
 
 
@@ -93,26 +155,139 @@ def parse_api_keys(raw_value):
     return [token.strip() for token in re.split(r'[;,\n\r\t ]+', raw_value) if token.strip()]
 
 
+class QuotasEsgotadasError(RuntimeError):
+    """Todas as chaves estão sem cota ou temporariamente bloqueadas."""
+
+    def __init__(self, message, retry_at=None):
+        super().__init__(message)
+        self.retry_at = retry_at
+
+
 class APIKeyRotator:
-    """Controla a alternância cíclica entre múltiplas chaves de API."""
+    """Controla a alternância entre múltiplas chaves de API.
+
+    Sem ledger, alterna de forma cíclica. Com um `QuotaLedger`, ignora chaves esgotadas ou
+    bloqueadas e escolhe a chave com menos requisições no dia, distribuindo a carga entre execuções.
+    Com `pace` e limite diário conhecido, também espaça as requisições para que a cota restante
+    dure até o reinício em vez de ser consumida no início do dia.
+    """
 
-    def __init__(self, api_keys):
+    def __init__(self, api_keys, ledger=None, pace=False):
         if not api_keys:
             raise ValueError("É necessário fornecer ao menos uma chave de API.")
         self._api_keys = api_keys
         self._index = 0
         self._total = len(api_keys)
+        self._ledger = ledger
+        self._pace = pace
+        self._next_request_at = 0.0
+        self._lock = threading.RLock()
 
     @property
     def total(self):
         return self._total
 
+    @property
+    def ledger(self):
+        return self._ledger
+
     def acquire_key(self):
         """Retorna a próxima chave e informações sobre a posição utilizada."""
-        api_key = self._api_keys[self._index]
-        slot = self._index + 1
-        self._index = (self._index + 1) % self._total
-        return api_key, slot, self._total
+        self._aguardar_ritmo()
+        with self._lock:
+            return self._acquire_key()
+
+    def _aguardar_ritmo(self):
+        """Reserva o próximo horário de envio e dorme até ele (fora do lock, para não travar outras threads)."""
+        if not self._pace or self._ledger is None:
+            return
+        with self._lock:
+            interval = self._ledger.pacing_interval(self._api_keys)
+            if not interval:
+                return
+            now = time.monotonic()
+            start = max(now, self._next_request_at)
+            self._next_request_at = start + interval
+        if start > now:
+            if start - now >= 1:
+                print(f"  - Ritmo de cota: aguardando {start - now:.0f}s para distribuir a cota até o reinício.")
+            time.sleep(start - now)
+
+    def _acquire_key(self):
+        if self._ledger is None:
+            api_key = self._api_keys[self._index]
+            slot = self._index + 1
+            self._index = (self._index + 1) % self._total
+            return api_key, slot, self._total
+
+        best_index = None
+        best_requests = None
+        earliest_retry = None
+        for offset in range(self._total):
+            index = (self._index + offset) % self._total
+            api_key = self._api_keys[index]
+            blocked_until = self._ledger.blocked_until(api_key)
+            if blocked_until is not None:
+                if earliest_retry is None or blocked_until < earliest_retry:
+                    earliest_retry = blocked_until
+                continue
+            requests = self._ledger.requests_today(api_key)
+            if best_requests is None or requests < best_requests:
+                best_index, best_requests = index, requests
+
+        if best_index is None:
+            # Bloqueios curtos (limite por minuto) são aguardados; cotas diárias interrompem o lote
+            wait = (earliest_retry - self._ledger.now()).total_seconds()
+            if wait <= MAX_KEY_COOLDOWN_WAIT:
+                print(f"  - Todas as chaves em pausa por limite de taxa; aguardando {max(wait, 0):.0f}s...")
+                time.sleep(max(wait, 0) + 1)
+                return self._acquire_key()
+            raise QuotasEsgotadasError(
+                f"Todas as {self._total} chave(s) estão sem cota ou bloqueadas até "
+                f"{earliest_retry:%Y-%m-%d %H:%M %Z}.",
+                retry_at=earliest_retry,
+            )
+        self._index = (best_index + 1) % self._total
+        return self._api_keys[best_index], best_index + 1, self._total
+
+    def record_success(self, api_key, tokens=None):
+        if self._ledger is not None:
+            self._ledger.record_success(api_key, tokens)
+
+    def record_error(self, api_key, error):
+        """Registra a falha da chave; devolve True se ela foi bloqueada por cota/limite."""
+        if self._ledger is None:
+            return False
+        return self._ledger.record_error(api_key, error)
+
+    def report_capacity(self, pending, provider_label):
+        """Mostra consumo do dia por chave e a capacidade restante estimada frente aos arquivos pendentes."""
+        if self._ledger is None:
+            return
+        print(f"Cotas {provider_label} (dia {self._ledger.quota_day()}, reinicia em "
+              f"{self._ledger.next_reset():%Y-%m-%d %H:%M %Z}):")
+        for slot, api_key in enumerate(self._api_keys, start=1):
+            entry = self._ledger.snapshot(api_key)
+            tokens = f"{entry['tokens']} tokens"
+            if entry.get('unmetered'):
+                tokens += f" (+{entry['unmetered']} requisição(ões) sem contagem)"
+            line = (f"  - Chave #{slot}: {entry['requests']} requisições, {tokens}, "
+                    f"{entry.get('errors', 0)} falha(s) hoje")
+            blocked_until = self._ledger.blocked_until(api_key)
+            if blocked_until is not None:
+                line += f" | bloqueada até {blocked_until:%Y-%m-%d %H:%M %Z}"
+            if entry.get('last_error'):
+                line += f" | último erro: {entry['last_error'][:80]}"
+            print(line)
+        remaining = self._ledger.remaining(self._api_keys)
+        if remaining is None:
+            print(f"  Limite diário por chave não configurado; não é possível projetar a capacidade "
+                  f"para {pending} arquivo(s) pendente(s).")
+        elif remaining >= pending:
+            print(f"  Capacidade restante hoje: {remaining} requisições para {pending} arquivo(s) pendente(s).")
+        else:
+            print(f"  Atenção: capacidade restante hoje é de {remaining} requisições para {pending} "
+                  f"arquivo(s) pendente(s); o lote não deve terminar antes do reinício da cota.")
 
 
 def load_gemini_keys_from_env():
@@ -135,18 +310,66 @@ def load_openai_keys_from_env():
         return [single_key.strip()]
     return []
 
-def redimensionar_imagem(caminho_imagem, max_dimensao=600):
-    """Redimensiona uma imagem para envio à API e retorna o caminho do arquivo temporário."""
+def limite_decodificacao_bytes():
+    """Teto de memória (bytes) para decodificar uma imagem, configurável via CSV_MAX_DECODE_MB (0 desativa)."""
+    raw = os.getenv('CSV_MAX_DECODE_MB', str(DEFAULT_MAX_DECODE_MB))
+    try:
+        return int(float(raw) * 1024 * 1024)
+    except ValueError:
+        logging.warning(f"CSV_MAX_DECODE_MB inválido ({raw!r}); usando {DEFAULT_MAX_DECODE_MB} MB.")
+        return DEFAULT_MAX_DECODE_MB * 1024 * 1024
+
+# Bytes por pixel que o Pillow aloca para cada modo; modos ausentes (RGB, RGBA, CMYK, LA, I, F...)
+# ocupam 4 bytes por pixel no armazenamento interno, mesmo com menos bandas.
+_BYTES_POR_PIXEL = {
+    '1': 1, 'L': 1, 'P': 1,
+    'I;16': 2, 'I;16L': 2, 'I;16B': 2, 'I;16N': 2,
+}
+_MODOS_SEM_CONVERSAO = ('RGB', 'L', 'RGBA', 'LA')
+
+def estimar_memoria_decodificacao(img):
+    """Pico estimado (bytes) para decodificar `img` e, se preciso, convertê-la em RGB no tamanho cheio."""
+    pixels = img.width * img.height
+    total = pixels * _BYTES_POR_PIXEL.get(img.mode, 4)
+    if img.mode not in _MODOS_SEM_CONVERSAO:
+        # A cópia RGB convive com a original até o fim da conversão
+        total += pixels * 4
+    return total
+
+def redimensionar_imagem(caminho_imagem, max_dimensao=600, max_decode_bytes=None):
+    """Redimensiona uma imagem para envio à API e retorna o caminho do arquivo temporário.
+
+    JPEGs são decodificados já reduzidos pela escala DCT (`draft`) e a redução acontece antes da
+    conversão de modo, de modo que o pico de memória acompanha o tamanho final e não o original.
+    Imagens cuja decodificação ultrapassa o teto de memória são rejeitadas antes de serem lidas.
+    """
+    if max_decode_bytes is None:
+        max_decode_bytes = limite_decodificacao_bytes()
     try:
         with Image.open(caminho_imagem) as img:
-            if img.mode in ('RGBA', 'LA'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                background.paste(img, (0, 0), img)
+            if img.format == 'JPEG':
+                img.draft('RGB', (max_dimensao, max_dimensao))
+
+            decode_bytes = estimar_memoria_decodificacao(img)
+            if max_decode_bytes and decode_bytes > max_decode_bytes:
+                logging.error(
+                    f"Imagem {caminho_imagem} ignorada: decodificação exigiria {decode_bytes / 1048576:.0f} MB "
+                    f"(limite {max_decode_bytes / 1048576:.0f} MB, ajuste CSV_MAX_DECODE_MB)."
+                )
+                return None
+
+            img_to_process = img
+            if img_to_process.mode not in _MODOS_SEM_CONVERSAO:
+                img_to_process = img_to_process.convert('RGB')
+            img_to_process.thumbnail((max_dimensao, max_dimensao))
+
+            if img_to_process.mode in ('RGBA', 'LA'):
+                background = Image.new('RGB', img_to_process.size, (255, 255, 255))
+                background.paste(img_to_process, (0, 0), img_to_process)
                 img_to_process = background
             else:
-                img_to_process = img.convert('RGB')
+                img_to_process = img_to_process.convert('RGB')
 
-            img_to_process.thumbnail((max_dimensao, max_dimensao))
             with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg', mode='wb') as temp_file:
                 img_to_process.save(temp_file, 'JPEG', quality=85)
                 return temp_file.name
@@ -157,18 +380,28 @@ def redimensionar_imagem(caminho_imagem, max_dimensao=600):
 def extrair_frame(caminho_video, max_dimensao=600):
     """Extracts and resizes a frame from a video, returns path to temp file."""
     video = cv2.VideoCapture(str(caminho_video))
+    frame_path = None
     try:
         success, image = video.read()
         if success:
+            # Reduz o quadro ainda em memória para não gravar/reler o frame em resolução total
+            height, width = image.shape[:2]
+            scale = max_dimensao / max(height, width)
+            if scale < 1:
+                size = (max(1, round(width * scale)), max(1, round(height * scale)))
+                image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
             with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                cv2.imwrite(temp_file.name, image)
-                return redimensionar_imagem(temp_file.name, max_dimensao)
+                frame_path = temp_file.name
+            cv2.imwrite(frame_path, image)
+            return redimensionar_imagem(frame_path, max_dimensao)
         return None
     except Exception as e:
         logging.error(f"Error extracting frame from {caminho_video}: {e}")
         return None
     finally:
         video.release()
+        if frame_path and os.path.exists(frame_path):
+            os.remove(frame_path)
 
 def gerar_csv(file_name, title, keywords, category_id, folder_path):
     """Gera um arquivo CSV com os metadados."""
@@ -176,30 +409,261 @@ def gerar_csv(file_name, title, keywords, category_id, folder_path):
     csv_file_name = f"adobe_metadata_{date_str}.csv"
     csv_path = folder_path / csv_file_name
 
-    file_exists = csv_path.exists()
+    with _CSV_LOCK:
+        file_exists = csv_path.exists()
 
-    with open(csv_path, mode='a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(['Filename', 'Title', 'Keywords', 'Category ID'])
-        
-        writer.writerow([file_name, title, keywords, category_id])
+        with open(csv_path, mode='a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if not file_exists:
+                writer.writerow(['Filename', 'Title', 'Keywords', 'Category ID'])
+
+            writer.writerow([file_name, title, keywords, category_id])
     print(f"  -> Metadata for {file_name} saved to {csv_path}")
 
+def registrar_no_catalogo(folder_path, row, provider="", model=""):
+    """Grava a linha no catálogo persistente, se habilitado, sem interromper o processamento."""
+    if CATALOG is None:
+        return
+    try:
+        CATALOG.add_row(folder_path, row, provider=provider, model=model)
+    except Exception as e:
+        logging.warning(f"Falha ao registrar {row.get('Filename')} no catálogo: {e}")
+
+def montar_linhas_export(base_rows, folder_path, extra_by_stem=None):
+    """Associa vetores da pasta às linhas pelo nome base; rasters com vetor correspondente são substituídos."""
+    vector_exts = {'.svg', '.eps'}
+    by_stem = dict(extra_by_stem or {})
+    for r in base_rows:
+        fn = r.get("Filename", "")
+        if fn:
+            by_stem[Path(fn).stem] = r
+    final_rows = []
+    seen_stems = set()
+    for p in folder_path.iterdir():
+        if p.suffix.lower() in vector_exts:
+            stem = p.stem
+            base = by_stem.get(stem)
+            if base:
+                clone = dict(base)
+                clone["Filename"] = p.name
+                final_rows.append(clone)
+                seen_stems.add(stem)
+    for stem, r in by_stem.items():
+        if stem not in seen_stems:
+            final_rows.append(r)
+    return final_rows
+
+class SaidaAgrupada(io.TextIOBase):
+    """stdout compartilhado por workers: a saída de cada arquivo é acumulada e impressa de uma vez.
+
+    Threads fora de `agrupar()` (como a principal) escrevem direto, uma linha inteira por vez.
+    """
+
+    def __init__(self, destino):
+        self._destino = destino
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is not None:
+            return buffer.write(text)
+        with self._lock:
+            return self._destino.write(text)
+
+    def flush(self):
+        with self._lock:
+            self._destino.flush()
+
+    @contextmanager
+    def agrupar(self):
+        self._local.buffer = io.StringIO()
+        try:
+            yield
+        finally:
+            text = self._local.buffer.getvalue()
+            self._local.buffer = None
+            with self._lock:
+                self._destino.write(text)
+                self._destino.flush()
+
+def perfil(estagio, always=False):
+    """Contexto de medição do estágio quando --profile está ativo; caso contrário, não faz nada."""
+    if PROFILER is None:
+        return nullcontext()
+    return PROFILER.track(estagio, always=always)
+
+def perfil_arquivo():
+    """Contexto que delimita um arquivo para a amostragem do --profile."""
+    if PROFILER is None:
+        return nullcontext()
+    return PROFILER.file_scope()
+
+def _bind_gemini_client(model):
+    """Fixa no modelo o cliente da chave configurada agora, em vez de resolvê-lo na primeira chamada."""
+    if getattr(model, '_client', False) is None:
+        model._client = genai_client.get_default_generative_client()
+    return model
+
 def build_gemini_model(api_key, model_name):
     """Configura e retorna o modelo generativo do Gemini."""
-    genai.configure(api_key=api_key)
-    return genai.GenerativeModel(
-        model_name=model_name,
-        system_instruction=system_prompt,
-    )
+    with _GEMINI_CONFIG_LOCK:
+        genai.configure(api_key=api_key)
+        return _bind_gemini_client(genai.GenerativeModel(
+            model_name=model_name,
+            system_instruction=system_prompt,
+        ))
+
+class GeminiPromptCache:
+    """Cache explícito (CachedContent) do system prompt no Gemini, um por chave/modelo na execução.
+
+    O cache é criado no primeiro uso, renovado antes de expirar e removido em `close()`. Se a
+    criação falhar (modelo sem suporte ou com mínimo de tokens maior), a combinação
+    chave/modelo segue sem cache pelo resto da execução.
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_PROMPT_CACHE_TTL):
+        self._ttl = timedelta(seconds=ttl_seconds)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _create(self, model_name):
+        qualified = model_name if model_name.startswith('models/') else f"models/{model_name}"
+        return genai.caching.CachedContent.create(
+            model=qualified,
+            display_name=PROMPT_CACHE_KEY,
+            system_instruction=system_prompt,
+            ttl=self._ttl,
+        )
 
-def generate_with_gemini(api_key, model_name, image_path):
-    """Gera metadados usando o modelo Gemini configurado."""
-    model = build_gemini_model(api_key, model_name)
+    def model_for(self, api_key, model_name):
+        """Modelo ligado ao cache da chave/modelo, ou None se o cache não estiver disponível."""
+        slot = (api_key, model_name)
+        with self._lock, _GEMINI_CONFIG_LOCK:
+            if slot in self._entries and self._entries[slot] is None:
+                return None
+            genai.configure(api_key=api_key)
+            entry = self._entries.get(slot)
+            now = time.monotonic()
+            if entry is not None and entry[1] - now < PROMPT_CACHE_REFRESH_MARGIN:
+                try:
+                    entry[0].update(ttl=self._ttl)
+                    entry = (entry[0], now + self._ttl.total_seconds())
+                except Exception:
+                    entry = None
+                self._entries[slot] = entry
+            if entry is None:
+                try:
+                    cached = self._create(model_name)
+                except Exception as e:
+                    print(f"  ? Cache de prompt Gemini indisponível para {model_name}: {e}. Seguindo sem cache.")
+                    self._entries[slot] = None
+                    return None
+                entry = (cached, now + self._ttl.total_seconds())
+                self._entries[slot] = entry
+            return _bind_gemini_client(genai.GenerativeModel.from_cached_content(cached_content=entry[0]))
+
+    def close(self):
+        with self._lock, _GEMINI_CONFIG_LOCK:
+            for (api_key, _), entry in self._entries.items():
+                if entry is None:
+                    continue
+                try:
+                    genai.configure(api_key=api_key)
+                    entry[0].delete()
+                except Exception as e:
+                    logging.warning(f"Falha ao remover cache de prompt Gemini: {e}")
+            self._entries.clear()
+
+def registrar_uso(usage):
+    """Soma o uso de tokens da requisição aos totais da execução (requisições sem contagem ficam à parte)."""
+    with _USAGE_LOCK:
+        if not usage.get("reported"):
+            USAGE_TOTALS["unreported"] += 1
+            return
+        USAGE_TOTALS["requests"] += 1
+        for field in ("input_tokens", "cached_tokens", "output_tokens"):
+            USAGE_TOTALS[field] += usage.get(field, 0) or 0
+
+def _extract_usage(response):
+    """Contagem de tokens da resposta (Gemini `usage_metadata` ou OpenAI `usage`), quando disponível.
+
+    `reported` indica se o provedor enviou a contagem; sem ela os campos ficam zerados e não devem
+    ser tratados como zero tokens consumidos.
+    """
+    usage = {"reported": False, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    meta = getattr(response, 'usage_metadata', None)
+    if meta is not None:
+        usage["reported"] = True
+        usage["input_tokens"] = getattr(meta, 'prompt_token_count', 0) or 0
+        usage["cached_tokens"] = getattr(meta, 'cached_content_token_count', 0) or 0
+        usage["output_tokens"] = getattr(meta, 'candidates_token_count', 0) or 0
+        usage["total_tokens"] = getattr(meta, 'total_token_count', 0) or 0
+        return usage
+
+    raw = response.get('usage') if isinstance(response, dict) else getattr(response, 'usage', None)
+    if raw is None:
+        return usage
+    usage["reported"] = True
+    if isinstance(raw, dict):
+        get = raw.get
+    else:
+        def get(name):
+            return getattr(raw, name, None)
+    usage["input_tokens"] = get('input_tokens') or get('prompt_tokens') or 0
+    details = get('input_tokens_details') or get('prompt_tokens_details')
+    if details is not None:
+        cached = details.get('cached_tokens') if isinstance(details, dict) else getattr(details, 'cached_tokens', 0)
+        usage["cached_tokens"] = cached or 0
+    usage["output_tokens"] = get('output_tokens') or get('completion_tokens') or 0
+    usage["total_tokens"] = get('total_tokens') or usage["input_tokens"] + usage["output_tokens"]
+    return usage
+
+def _fechar_stream(stream):
+    """Encerra um stream de resposta, liberando a conexão mesmo quando a leitura parou antes do fim."""
+    close = getattr(stream, 'close', None)
+    if close is None:
+        # GenerateContentResponse do Gemini não expõe close(); a chamada gRPC fica em `_iterator`
+        iterator = getattr(stream, '_iterator', None)
+        close = getattr(iterator, 'cancel', None) or getattr(iterator, 'close', None)
+    if close is not None:
+        close()
+
+
+def generate_with_gemini(api_key, model_name, image_path, stream=False, on_field=None):
+    """Gera metadados usando o modelo Gemini configurado; devolve o texto e o uso de tokens.
+
+    Com `stream=True`, os campos são extraídos à medida que os trechos chegam e o stream é
+    cancelado assim que `</METADATA>` fecha.
+    """
+    model = GEMINI_PROMPT_CACHE.model_for(api_key, model_name) if GEMINI_PROMPT_CACHE is not None else None
+    if model is None:
+        model = build_gemini_model(api_key, model_name)
     with Image.open(image_path) as img:
-        response = model.generate_content(img)
-    return response.text
+        if not stream:
+            response = model.generate_content(img)
+            return response.text, _extract_usage(response)
+
+        parser = MetadataStreamParser(on_field)
+        usage = _extract_usage(None)
+        response = model.generate_content(img, stream=True)
+        try:
+            for chunk in response:
+                if getattr(chunk, 'usage_metadata', None) is not None:
+                    usage = _extract_usage(chunk)
+                try:
+                    parser.feed(chunk.text)
+                except ValueError:
+                    # Trecho sem partes de texto (ex.: apenas finish_reason)
+                    continue
+                if parser.done:
+                    break
+        finally:
+            _fechar_stream(response)
+    return parser.text, usage
 
 
 def _ensure_openai_available():
@@ -275,28 +739,49 @@ def _normalize_openai_output(payload):
     return str(payload).strip()
 
 
-def generate_with_openai(api_key, model_name, image_path):
-    """Gera metadados usando um modelo da OpenAI com suporte a imagens."""
+def generate_with_openai(api_key, model_name, image_path, stream=False, on_field=None):
+    """Gera metadados usando um modelo da OpenAI com suporte a imagens; devolve o texto e o uso de tokens.
+
+    Com `stream=True`, o stream é fechado assim que `</METADATA>` chega.
+    """
     _ensure_openai_available()
     with open(image_path, 'rb') as image_file:
         image_b64 = base64.b64encode(image_file.read()).decode('utf-8')
 
     if OpenAI is not None:
         client = OpenAI(api_key=api_key)
-        response = client.responses.create(
-            model=model_name,
-            input=[
-                {"role": "system", "content": [{"type": "text", "text": system_prompt}]},
-                {"role": "user", "content": [
-                    {"type": "input_text", "text": "Analyze the image and respond following the XML schema."},
-                    {"type": "input_image", "image_base64": image_b64}
-                ]}
-            ],
-        )
-        return _normalize_openai_output(response)
+        # Prefixo estático (system prompt + instrução) antes da imagem, para o cache automático da OpenAI
+        request_options = {}
+        if PROMPT_CACHE_ENABLED:
+            request_options["extra_body"] = {"prompt_cache_key": PROMPT_CACHE_KEY}
+        request_input = [
+            {"role": "system", "content": [{"type": "text", "text": system_prompt}]},
+            {"role": "user", "content": [
+                {"type": "input_text", "text": "Analyze the image and respond following the XML schema."},
+                {"type": "input_image", "image_base64": image_b64}
+            ]}
+        ]
+        if not stream:
+            response = client.responses.create(model=model_name, input=request_input, **request_options)
+            return _normalize_openai_output(response), _extract_usage(response)
+
+        parser = MetadataStreamParser(on_field)
+        usage = _extract_usage(None)
+        events = client.responses.create(model=model_name, input=request_input, stream=True, **request_options)
+        try:
+            for event in events:
+                event_type = getattr(event, 'type', '')
+                if event_type == 'response.output_text.delta':
+                    parser.feed(getattr(event, 'delta', '') or '')
+                    if parser.done:
+                        break
+                elif event_type == 'response.completed':
+                    usage = _extract_usage(getattr(event, 'response', None))
+        finally:
+            _fechar_stream(events)
+        return parser.text, usage
 
     # Fallback para cliente legado
-    openai_legacy.api_key = api_key
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": [
@@ -304,30 +789,117 @@ def generate_with_openai(api_key, model_name, image_path):
             {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_b64}"}}
         ]}
     ]
-    response = openai_legacy.ChatCompletion.create(
-        model=model_name,
-        messages=messages
-    )
-    return _normalize_openai_output(response)
+    if not stream:
+        response = openai_legacy.ChatCompletion.create(
+            model=model_name,
+            messages=messages,
+            api_key=api_key
+        )
+        return _normalize_openai_output(response), _extract_usage(response)
+
+    parser = MetadataStreamParser(on_field)
+    chunks = openai_legacy.ChatCompletion.create(model=model_name, messages=messages, stream=True,
+                                                 api_key=api_key)
+    try:
+        for chunk in chunks:
+            choices = chunk.get('choices') or [{}]
+            parser.feed((choices[0].get('delta') or {}).get('content') or '')
+            if parser.done:
+                break
+    finally:
+        _fechar_stream(chunks)
+    return parser.text, _extract_usage(None)
+
+_TITLE_RE = re.compile(r"<TITLE>(.*?)</TITLE>", re.DOTALL)
+_DESCRIPTION_RE = re.compile(r"<DESCRIPTION>(.*?)</DESCRIPTION>", re.DOTALL)
+_KEYWORDS_RE = re.compile(r"<KEYWORDS>(.*?)</KEYWORDS>", re.DOTALL)
+_CATEGORY_ID_RE = re.compile(r"<CATEGORY_ID>(.*?)</CATEGORY_ID>", re.DOTALL)
 
 def parse_response(text):
     """Extrai os metadados da resposta XML de forma segura e eficiente."""
-    title_match = re.search(r"<TITLE>(.*?)</TITLE>", text, re.DOTALL)
+    title_match = _TITLE_RE.search(text)
     title = title_match.group(1).strip() if title_match else "Not found"
 
-    description_match = re.search(r"<DESCRIPTION>(.*?)</DESCRIPTION>", text, re.DOTALL)
+    description_match = _DESCRIPTION_RE.search(text)
     description = description_match.group(1).strip() if description_match else "Not found"
 
-    keywords_match = re.search(r"<KEYWORDS>(.*?)</KEYWORDS>", text, re.DOTALL)
+    keywords_match = _KEYWORDS_RE.search(text)
     keywords = keywords_match.group(1).strip() if keywords_match else "Not found"
 
-    category_id_match = re.search(r"<CATEGORY_ID>(.*?)</CATEGORY_ID>", text, re.DOTALL)
+    category_id_match = _CATEGORY_ID_RE.search(text)
     category_id = category_id_match.group(1).strip() if category_id_match else "Not found"
     
     return title, description, keywords, category_id
 
-def process_file_single_call(provider, api_key_rotator, active_model, file_path, folder_path):
-    """Preparar e processar um arquivo (imagem ou vídeo) e depois limpar os arquivos temporários."""
+class MetadataStreamParser:
+    """Acumula uma resposta em streaming e entrega cada campo assim que sua tag de fechamento chega."""
+
+    FIELDS = (
+        ("title", _TITLE_RE),
+        ("description", _DESCRIPTION_RE),
+        ("keywords", _KEYWORDS_RE),
+        ("category_id", _CATEGORY_ID_RE),
+    )
+    END_TAG = "</METADATA>"
+
+    def __init__(self, on_field=None):
+        self.text = ""
+        self.fields = {}
+        self.done = False
+        self._on_field = on_field
+
+    def feed(self, chunk):
+        if not chunk or self.done:
+            return
+        self.text += chunk
+        if "</" not in self.text[-(len(chunk) + len(self.END_TAG)):]:
+            return
+        for name, pattern in self.FIELDS:
+            if name in self.fields:
+                continue
+            match = pattern.search(self.text)
+            if match:
+                self.fields[name] = match.group(1).strip()
+                if self._on_field is not None:
+                    self._on_field(name, self.fields[name])
+        end = self.text.find(self.END_TAG)
+        if end != -1:
+            self.text = self.text[:end + len(self.END_TAG)]
+            self.done = True
+
+def mostrar_campo_stream(name, value):
+    """Exibe o título assim que ele chega no streaming, antes das keywords."""
+    if name == "title":
+        print(f"  - Título recebido (streaming): {value}")
+
+def montar_linha(file_name, title, description, keywords, category_id):
+    """Linha no formato aceito pelos exporters."""
+    return {
+        "Filename": file_name,
+        "Title": title,
+        "Description": description,
+        "Keywords": keywords,
+        "Category ID": category_id,
+        "Releases": "",
+        "DT_Category2": "",
+        "DT_Category3": ""
+    }
+
+def arquivar_resposta(file_name, response_text, provider, model, usage=None):
+    """Guarda a resposta bruta no arquivo da pasta, sem interromper o processamento em caso de erro."""
+    if RESPONSE_ARCHIVE is None:
+        return
+    try:
+        RESPONSE_ARCHIVE.append(file_name, response_text, provider=provider, model=model, usage=usage)
+    except Exception as e:
+        logging.warning(f"Falha ao arquivar a resposta de {file_name}: {e}")
+
+def process_file_single_call(provider, api_key_rotator, active_model, file_path, folder_path, stream=False,
+                             on_call_result=None):
+    """Preparar e processar um arquivo (imagem ou vídeo) e depois limpar os arquivos temporários.
+
+    `on_call_result(latencia, erro)` é chamado após cada chamada ao provedor (erro None em caso de sucesso).
+    """
     print("-" * 50)
     print(f"Processando arquivo original: {file_path.name}")
 
@@ -337,10 +909,12 @@ def process_file_single_call(provider, api_key_rotator, active_model, file_path,
 
         if file_extension in ('.jpg', '.jpeg', '.png', '.webp'):
             print("  - Redimensionando a imagem para envio...")
-            temp_image_path = redimensionar_imagem(file_path)
+            with perfil("redimensionar_imagem"):
+                temp_image_path = redimensionar_imagem(file_path)
         elif file_extension == '.mp4':
             print("  - Extraindo quadros do vídeo para envio...")
-            temp_image_path = extrair_frame(file_path)
+            with perfil("extrair_frame"):
+                temp_image_path = extrair_frame(file_path)
         else:
             print(f"  - Tipo de arquivo não suportado: {file_extension}")
             return False
@@ -355,27 +929,44 @@ def process_file_single_call(provider, api_key_rotator, active_model, file_path,
             print(f"  - Alternando para chave {provider_label} #{slot}/{total}.")
         print(f"  - Enviando arquivo processado para {provider_label}...")
 
-        if provider == "gemini":
-            response_text = generate_with_gemini(api_key, active_model, temp_image_path)
-        else:
-            response_text = generate_with_openai(api_key, active_model, temp_image_path)
+        call_started = time.monotonic()
+        try:
+            if provider == "gemini":
+                with perfil("generate_with_gemini"):
+                    response_text, usage = generate_with_gemini(api_key, active_model, temp_image_path,
+                                                                stream=stream, on_field=mostrar_campo_stream)
+            else:
+                with perfil("generate_with_openai"):
+                    response_text, usage = generate_with_openai(api_key, active_model, temp_image_path,
+                                                                stream=stream, on_field=mostrar_campo_stream)
+        except Exception as e:
+            if on_call_result:
+                on_call_result(time.monotonic() - call_started, e)
+            if api_key_rotator.record_error(api_key, e):
+                print(f"  ? Chave {provider_label} #{slot}/{total} atingiu cota/limite e será evitada até liberar.")
+            raise
+        if on_call_result:
+            on_call_result(time.monotonic() - call_started, None)
+        api_key_rotator.record_success(api_key, usage["total_tokens"] if usage["reported"] else None)
+        registrar_uso(usage)
+        if PROMPT_CACHE_ENABLED:
+            if usage["reported"]:
+                print(f"  - Tokens: entrada {usage['input_tokens']} (cache {usage['cached_tokens']}), "
+                      f"saída {usage['output_tokens']}")
+            else:
+                print("  - Tokens: não informados pelo provedor.")
+        arquivar_resposta(file_path.name, response_text, provider, active_model, usage)
 
-        title, description, keywords, category_id = parse_response(response_text)
+        with perfil("parse_response"):
+            title, description, keywords, category_id = parse_response(response_text)
 
         # Acumular resultado desta execução para os exports externos
+        row = montar_linha(file_path.name, title, description, keywords, category_id)
         try:
-            API_ROWS.append({
-                "Filename": file_path.name,
-                "Title": title,
-                "Description": description,
-                "Keywords": keywords,
-                "Category ID": category_id,
-                "Releases": "",
-                "DT_Category2": "",
-                "DT_Category3": ""
-            })
+            API_ROWS.append(row)
         except Exception:
             pass
+        registrar_no_catalogo(folder_path, row, provider, active_model)
 
         print("\\n? --- Metadados gerados --- ?")
         print(f"Title: {title}")
@@ -389,6 +980,8 @@ def process_file_single_call(provider, api_key_rotator, active_model, file_path,
 
         return True
 
+    except QuotasEsgotadasError:
+        raise
     except Exception as e:
         print(f"  ? Ocorreu um erro durante o processamento: {e}")
         return False
@@ -398,6 +991,175 @@ def process_file_single_call(provider, api_key_rotator, active_model, file_path,
 
 
 
+def selecionar_pasta(folder_arg):
+    """Resolve a pasta de trabalho pelo argumento ou pela janela de seleção; devolve None se inválida."""
+    if folder_arg:
+        folder_path = Path(folder_arg)
+        print(f"Usando o caminho fornecido pelo argumento: {folder_path}")
+    else:
+        root = tk.Tk()
+        root.withdraw()
+        folder_path_str = filedialog.askdirectory(title="Selecione a pasta a ser processada")
+        if not folder_path_str:
+            print("Nenhuma pasta selecionada. Saindo.")
+            return None
+        folder_path = Path(folder_path_str)
+        print(f"Usando caminho: {folder_path}")
+
+    if not folder_path.is_dir():
+        print(f"ERROR: O caminho '{folder_path}' não é uma pasta válida.")
+        return None
+    return folder_path
+
+
+def abrir_catalogo(catalog_path):
+    """Abre o catálogo SQLite e o deixa disponível globalmente em CATALOG."""
+    global CATALOG
+    if MetadataCatalog is None:
+        print("?? metadata_catalog.py não encontrado; catálogo desativado.")
+        return None
+    try:
+        CATALOG = MetadataCatalog(catalog_path)
+        print(f"Usando catálogo de metadados: {catalog_path}")
+    except Exception as e:
+        print(f"?? Falha ao abrir o catálogo {catalog_path}: {e}. Seguindo sem catálogo.")
+        CATALOG = None
+    return CATALOG
+
+
+def interpretar_intervalo(export_range):
+    """Converte o valor de --export-range em (inicio, fim) no formato YYYY-MM-DD; None = sem limite.
+
+    Levanta ValueError para datas fora do formato ou intervalo invertido, já que o catálogo
+    compara as datas como texto e um `2025-9-1` resultaria em um intervalo errado sem aviso.
+    """
+    spec = (export_range or '').strip()
+    if spec.lower() in ('', 'all'):
+        return None, None
+    parts = [part.strip() for part in spec.split(':', 1)] if ':' in spec else [spec, spec]
+    dates = []
+    for part in parts:
+        if not part:
+            dates.append(None)
+            continue
+        try:
+            dates.append(datetime.strptime(part, "%Y-%m-%d").strftime("%Y-%m-%d"))
+        except ValueError:
+            raise ValueError(f"data inválida '{part}' (use YYYY-MM-DD)") from None
+    date_from, date_to = dates
+    if date_from and date_to and date_from > date_to:
+        raise ValueError(f"início {date_from} é posterior ao fim {date_to}")
+    return date_from, date_to
+
+def exportar_do_catalogo(folder_path, export_range):
+    """Regera os exports da pasta a partir do catálogo, sem chamadas de API nem leitura de CSV.
+
+    `export_range` aceita `YYYY-MM-DD`, `INICIO:FIM` (qualquer lado pode ficar vazio) ou `all`.
+    """
+    if CATALOG is None:
+        print("?? Catálogo indisponível; não é possível exportar por intervalo.")
+        return
+    if not export_from_rows:
+        print("?? exporters_core.py não encontrado; pulando exports externos.")
+        return
+
+    try:
+        date_from, date_to = interpretar_intervalo(export_range)
+    except ValueError as e:
+        print(f"?? --export-range inválido: {e}. Formatos aceitos: YYYY-MM-DD, INICIO:FIM ou all.")
+        return
+
+    rows = CATALOG.rows_for(folder=folder_path, date_from=date_from, date_to=date_to)
+    if not rows:
+        print("?? Nenhuma linha no catálogo para esta pasta/intervalo; nada para exportar.")
+        return
+
+    if date_from and date_from == date_to:
+        stem = date_from
+    else:
+        stem = f"{date_from or 'inicio'}_{date_to or 'fim'}"
+    final_rows = montar_linhas_export(rows, folder_path)
+    export_from_rows(final_rows, outdir=folder_path,
+                     targets=['freepik', 'dreamstime'],
+                     config_path=None, master_stem=stem)
+    print(f"?? Exports gerados a partir do catálogo ({len(final_rows)} linha(s), {stem}).")
+
+
+def abrir_arquivo_respostas(folder_path):
+    """Prepara o arquivo de respostas brutas da pasta e o deixa disponível em RESPONSE_ARCHIVE."""
+    global RESPONSE_ARCHIVE
+    if ResponseArchive is None:
+        return None
+    RESPONSE_ARCHIVE = ResponseArchive(folder_path)
+    return RESPONSE_ARCHIVE
+
+
+def ativar_cache_de_prompt(provider):
+    """Liga o cache do system prompt: CachedContent no Gemini, `prompt_cache_key` na OpenAI.
+
+    Com o prompt abaixo do mínimo de tokens dos provedores o cache não teria efeito (o Gemini
+    recusa a criação e a OpenAI não reutiliza o prefixo), então ele não é ativado.
+    """
+    global PROMPT_CACHE_ENABLED, GEMINI_PROMPT_CACHE
+    if PROMPT_ESTIMATED_TOKENS < PROMPT_CACHE_MIN_TOKENS:
+        print(f"Cache de prompt não ativado: o system prompt tem ~{PROMPT_ESTIMATED_TOKENS} tokens, abaixo do "
+              f"mínimo de {PROMPT_CACHE_MIN_TOKENS} exigido pelo provedor; com o prompt atual o cache não "
+              f"teria efeito.")
+        return
+    PROMPT_CACHE_ENABLED = True
+    if provider == 'gemini':
+        try:
+            ttl = int(os.getenv('CSV_PROMPT_CACHE_TTL') or DEFAULT_PROMPT_CACHE_TTL)
+        except ValueError:
+            ttl = DEFAULT_PROMPT_CACHE_TTL
+        GEMINI_PROMPT_CACHE = GeminiPromptCache(ttl_seconds=ttl)
+        print(f"Cache de prompt Gemini ativo (TTL {ttl}s, um cache por chave/modelo).")
+    else:
+        print(f"Cache de prompt OpenAI ativo (prompt_cache_key={PROMPT_CACHE_KEY}).")
+
+
+def iniciar_profiler(folder_path, sample_every):
+    """Ativa o --profile, gravando os relatórios em uma subpasta `profile_<data-hora>` da pasta processada."""
+    global PROFILER
+    if RunProfiler is None:
+        print("?? run_profiler.py não encontrado; --profile ignorado.")
+        return None
+    output_dir = folder_path / f"profile_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}"
+    PROFILER = RunProfiler(output_dir, sample_every=sample_every)
+    print(f"Profiling ativo: 1 a cada {PROFILER.sample_every} arquivo(s); relatórios em {output_dir}")
+    return PROFILER
+
+
+def reexportar_do_arquivo(folder_path):
+    """Regera os CSVs Adobe/Freepik/Dreamstime da pasta a partir das respostas arquivadas, sem rede."""
+    if ResponseArchive is None:
+        print("?? response_archive.py não encontrado; não é possível reexportar.")
+        return
+    if not export_from_rows:
+        print("?? exporters_core.py não encontrado; pulando exports externos.")
+        return
+
+    archive = ResponseArchive(folder_path)
+    records = archive.latest_by_filename()
+    if not records:
+        print(f"?? Nenhuma resposta arquivada em {archive.path}; nada para reexportar.")
+        return
+
+    rows = []
+    for file_name, record in records.items():
+        title, description, keywords, category_id = parse_response(record.get("response", ""))
+        rows.append(montar_linha(file_name, title, description, keywords, category_id))
+
+    stem = f"reexport_{datetime.now().strftime('%Y-%m-%d')}"
+    final_rows = montar_linhas_export(rows, folder_path)
+    paths = export_from_rows(final_rows, outdir=folder_path,
+                             targets=['adobestock', 'freepik', 'dreamstime'],
+                             config_path=None, master_stem=stem)
+    print(f"?? Reexport concluído a partir de {len(records)} resposta(s) arquivada(s):")
+    for path in paths:
+        print(f"  -> {path}")
+
+
 def main():
     """Função principal que valida as configurações e percorre a pasta de imagens."""
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -408,6 +1170,19 @@ def main():
     provider_override = None
     model_override = None
     folder_arg = None
+    catalog_override = None
+    use_catalog = True
+    export_range = None
+    reexport = False
+    profile_enabled = False
+    profile_every = 1
+    stream_enabled = os.getenv('CSV_STREAM', '').strip().lower() in ('1', 'true', 'yes', 'on')
+    prompt_cache_enabled = os.getenv('CSV_PROMPT_CACHE', '').strip().lower() in ('1', 'true', 'yes', 'on')
+    raw_concurrency = os.getenv('CSV_MAX_CONCURRENCY', '').strip()
+    pace_quota = os.getenv('CSV_QUOTA_PACING', '').strip().lower() in ('1', 'true', 'yes', 'on')
+    if args and args[0] == 'reexport':
+        reexport = True
+        args = args[1:]
     idx = 0
     while idx < len(args):
         arg = args[idx]
@@ -427,6 +1202,61 @@ def main():
                 idx += 1
             else:
                 print("Flag --model requer um valor. Mantendo configuração padrão.")
+        elif arg.startswith('--catalog='):
+            catalog_override = arg.split('=', 1)[1].strip()
+        elif arg == '--catalog':
+            if idx + 1 < len(args):
+                catalog_override = args[idx + 1].strip()
+                idx += 1
+            else:
+                print("Flag --catalog requer um caminho. Mantendo configuração padrão.")
+        elif arg == '--no-catalog':
+            use_catalog = False
+        elif arg == '--reexport':
+            reexport = True
+        elif arg == '--profile':
+            profile_enabled = True
+        elif arg == '--stream':
+            stream_enabled = True
+        elif arg == '--no-stream':
+            stream_enabled = False
+        elif arg == '--pace-quota':
+            pace_quota = True
+        elif arg == '--no-pace-quota':
+            pace_quota = False
+        elif arg == '--prompt-cache':
+            prompt_cache_enabled = True
+        elif arg == '--no-prompt-cache':
+            prompt_cache_enabled = False
+        elif arg.startswith('--profile-every=') or arg == '--profile-every':
+            if '=' in arg:
+                raw_every = arg.split('=', 1)[1].strip()
+            elif idx + 1 < len(args):
+                raw_every = args[idx + 1].strip()
+                idx += 1
+            else:
+                raw_every = ''
+            try:
+                profile_every = max(1, int(raw_every))
+                profile_enabled = True
+            except ValueError:
+                print("Flag --profile-every requer um número inteiro (ex: 10). Usando 1.")
+        elif arg.startswith('--max-concurrency=') or arg == '--max-concurrency':
+            if '=' in arg:
+                raw_concurrency = arg.split('=', 1)[1].strip()
+            elif idx + 1 < len(args):
+                raw_concurrency = args[idx + 1].strip()
+                idx += 1
+            else:
+                print("Flag --max-concurrency requer um número inteiro (ex: 4). Mantendo configuração padrão.")
+        elif arg.startswith('--export-range='):
+            export_range = arg.split('=', 1)[1].strip()
+        elif arg == '--export-range':
+            if idx + 1 < len(args):
+                export_range = args[idx + 1].strip()
+                idx += 1
+            else:
+                print("Flag --export-range requer um valor (YYYY-MM-DD, INICIO:FIM ou all).")
         else:
             if folder_arg is None:
                 folder_arg = arg
@@ -434,6 +1264,34 @@ def main():
                 print(f"Aviso: argumento extra '{arg}' será ignorado.")
         idx += 1
 
+    max_concurrency = DEFAULT_MAX_CONCURRENCY
+    if raw_concurrency:
+        try:
+            max_concurrency = max(1, int(raw_concurrency))
+        except ValueError:
+            print(f"Aviso: concorrência máxima inválida '{raw_concurrency}'. Usando {DEFAULT_MAX_CONCURRENCY}.")
+
+    catalog_path = Path(catalog_override or os.getenv('CSV_CATALOG_PATH') or DEFAULT_CATALOG_PATH)
+
+    if reexport:
+        folder_path = selecionar_pasta(folder_arg)
+        if folder_path is None:
+            return
+        reexportar_do_arquivo(folder_path)
+        return
+
+    if export_range is not None:
+        folder_path = selecionar_pasta(folder_arg)
+        if folder_path is None:
+            return
+        abrir_catalogo(catalog_path)
+        try:
+            exportar_do_catalogo(folder_path, export_range)
+        finally:
+            if CATALOG is not None:
+                CATALOG.close()
+        return
+
     provider = (provider_override or os.getenv('CSV_PROVIDER') or 'gemini').lower()
     if provider not in SUPPORTED_PROVIDERS:
         print(f"Provedor '{provider}' não reconhecido. Usando 'gemini'.")
@@ -445,6 +1303,7 @@ def main():
         default_model = DEFAULT_OPENAI_MODEL
         key_var_plural = 'OPENAI_API_KEYS'
         key_var_single = 'OPENAI_API_KEY'
+        daily_limit_var = 'OPENAI_DAILY_LIMIT'
         provider_label = 'OpenAI'
     else:
         provider = 'gemini'
@@ -453,6 +1312,7 @@ def main():
         default_model = DEFAULT_GEMINI_MODEL
         key_var_plural = 'GEMINI_API_KEYS'
         key_var_single = 'GEMINI_API_KEY'
+        daily_limit_var = 'GEMINI_DAILY_LIMIT'
         provider_label = 'Gemini'
 
     active_model = model_override or env_model or default_model
@@ -478,24 +1338,31 @@ def main():
     if len(api_keys) > 1:
         print(f"Foram encontradas {len(api_keys)} chaves {provider_label}. Cada requisição usará a próxima chave da lista.")
 
-    api_key_rotator = APIKeyRotator(api_keys)
+    ledger = None
+    if QuotaLedger is not None:
+        ledger_path = Path(os.getenv('CSV_QUOTA_LEDGER_PATH') or DEFAULT_QUOTA_LEDGER_PATH)
+        try:
+            daily_limit = int(os.getenv(daily_limit_var) or 0)
+        except ValueError:
+            print(f"{daily_limit_var} inválido; limite diário por chave não será considerado.")
+            daily_limit = 0
+        ledger = QuotaLedger(ledger_path, provider, daily_limit)
+
+    api_key_rotator = APIKeyRotator(api_keys, ledger=ledger, pace=pace_quota)
+    if pace_quota and (ledger is None or not ledger.daily_limit):
+        print(f"Aviso: --pace-quota requer {daily_limit_var}; requisições não serão espaçadas.")
+
+    folder_path = selecionar_pasta(folder_arg)
+    if folder_path is None:
+        return
 
-    if folder_arg:
-        folder_path = Path(folder_arg)
-        print(f"Usando o caminho fornecido pelo argumento: {folder_path}")
-    else:
-        root = tk.Tk()
-        root.withdraw()
-        folder_path_str = filedialog.askdirectory(title="Selecione a pasta a ser processada")
-        if not folder_path_str:
-            print("Nenhuma pasta selecionada. Saindo.")
-            return
-        folder_path = Path(folder_path_str)
-        print(f"Usando caminho: {folder_path}")
+    if use_catalog:
+        abrir_catalogo(catalog_path)
 
-    if not folder_path.is_dir():
-        print(f"ERROR: O caminho '{folder_path}' não é uma pasta válida.")
-        return
+    abrir_arquivo_respostas(folder_path)
+
+    if profile_enabled:
+        iniciar_profiler(folder_path, profile_every)
 
     processed_log_path = folder_path / 'processed_files.txt'
     processed_files = set()
@@ -511,17 +1378,73 @@ def main():
         return
 
     print(f"\\nUsando provedor: {provider_label} | modelo: {active_model}")
+    if stream_enabled:
+        print("Streaming ativo: cada resposta é encerrada assim que </METADATA> chega.")
+    if prompt_cache_enabled:
+        ativar_cache_de_prompt(provider)
     print(f"Found {len(files_to_process)} total de arquivos. Iniciando processamento...\\n")
 
+    pending_files = []
     for file_path in files_to_process:
         if file_path.name in processed_files:
             print(f"? Ignorando arquivo já processado: {file_path.name}")
             continue
-
-        if process_file_single_call(provider, api_key_rotator, active_model, file_path, folder_path):
-            with open(processed_log_path, 'a') as f:
-                f.write(f"{file_path.name}\\n")
-            print(f"  -> Registrada {file_path.name} para processar arquivos de log.")
+        pending_files.append(file_path)
+    api_key_rotator.report_capacity(len(pending_files), provider_label)
+
+    controller = None
+    if max_concurrency > 1:
+        if AIMDController is not None:
+            controller = AIMDController(max_concurrency)
+            print(f"Concorrência adaptativa ativa: janela inicial {controller.limit}, teto {max_concurrency}.")
+        else:
+            print("Aviso: módulo adaptive_concurrency indisponível; processando um arquivo por vez.")
+    on_call_result = controller.record if controller is not None else None
+
+    # Com vários arquivos em voo, a saída de cada um sai em bloco para não intercalar linhas
+    saida = SaidaAgrupada(sys.stdout) if controller is not None else None
+
+    def processar(file_path):
+        with saida.agrupar() if saida is not None else nullcontext(), perfil_arquivo():
+            return process_file_single_call(provider, api_key_rotator, active_model, file_path, folder_path,
+                                            stream=stream_enabled, on_call_result=on_call_result)
+
+    # Novos arquivos só são enviados enquanto houver espaço na janela; ela cresce com respostas
+    # saudáveis e encolhe com 429/5xx/timeouts, sem nunca passar do teto configurado.
+    quota_error = None
+    in_flight = {}
+    next_index = 0
+    stdout_original = sys.stdout
+    if saida is not None:
+        sys.stdout = saida
+    try:
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            while in_flight or (quota_error is None and next_index < len(pending_files)):
+                window = controller.limit if controller is not None else 1
+                while quota_error is None and next_index < len(pending_files) and len(in_flight) < window:
+                    file_path = pending_files[next_index]
+                    next_index += 1
+                    in_flight[executor.submit(processar, file_path)] = file_path
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path = in_flight.pop(future)
+                    try:
+                        processed_ok = future.result()
+                    except QuotasEsgotadasError as e:
+                        if quota_error is None:
+                            quota_error = e
+                            print(f"?? {e} Interrompendo o lote; os arquivos restantes ficam para a próxima execução.")
+                        continue
+                    except Exception as e:
+                        # Falha inesperada em um worker não derruba o lote: o arquivo conta como não processado
+                        logging.exception(f"Falha inesperada ao processar {file_path.name}: {e}")
+                        continue
+                    if processed_ok:
+                        with open(processed_log_path, 'a') as f:
+                            f.write(f"{file_path.name}\\n")
+                        print(f"  -> Registrada {file_path.name} para processar arquivos de log.")
+    finally:
+        sys.stdout = stdout_original
 
     print("?? Processamento de todas as imagens concluído!")
 
@@ -532,59 +1455,65 @@ def main():
     csv_file_name = f"adobe_metadata_{date_str}.csv"
     csv_path = folder_path / csv_file_name
 
+    # O CSV master do dia é sempre lido: rasters gerados hoje sem catálogo (--no-catalog, versão
+    # anterior ou catálogo que não abriu) só existem nele. Com o catálogo, a busca indexada cobre
+    # também os dias anteriores da pasta e o CSV fica como segunda opção.
+    metadata_map = {}
+    sem_metadados = " Nenhum arquivo vetorial será processado." if CATALOG is None else ""
     if not csv_path.exists():
-        print("  - Arquivo de metadados não encontrado. Nenhum arquivo vetorial será processado.")
+        if CATALOG is None:
+            print("  - Arquivo de metadados não encontrado. Nenhum arquivo vetorial será processado.")
     else:
-        # Ler metadados existentes do CSV
-        metadata_map = {}
         try:
             with open(csv_path, mode='r', newline='', encoding='utf-8') as f:
                 reader = csv.DictReader(f)
                 if not reader.fieldnames:
-                    print("  - Arquivo de metadados está vazio. Nenhum arquivo vetorial será processado.")
+                    if CATALOG is None:
+                        print("  - Arquivo de metadados está vazio. Nenhum arquivo vetorial será processado.")
                 else:
                     for row in reader:
                         base_name = Path(row['Filename']).stem
                         metadata_map[base_name] = row
         except Exception as e:
-            print(f"  - Erro ao ler o arquivo CSV: {e}. Nenhum arquivo vetorial será processado.")
+            print(f"  - Erro ao ler o arquivo CSV: {e}.{sem_metadados}")
 
-        if not metadata_map:
-            print("  - Nenhum metadado encontrado no arquivo CSV. Nenhum arquivo vetorial será processado.")
+    vector_rows = {}
+    if CATALOG is None and not metadata_map:
+        print("  - Nenhum metadado encontrado no arquivo CSV. Nenhum arquivo vetorial será processado.")
+    else:
+        vector_extensions = ('.svg', '.eps')
+        vector_files_found = [p for p in folder_path.iterdir() if p.suffix.lower() in vector_extensions]
+
+        added_count = 0
+        for vector_path in vector_files_found:
+            if vector_path.name in processed_files:
+                print(f"  ? Ignorando arquivo vetorial já processado: {vector_path.name}")
+                continue
+
+            vector_base_name = vector_path.stem
+            metadata = CATALOG.find_by_stem(vector_base_name, folder_path) if CATALOG is not None else None
+            if metadata is None:
+                metadata = metadata_map.get(vector_base_name)
+            if metadata:
+                print(f"  ? Encontrada correspondência para: {vector_path.name}")
+
+                gerar_csv(vector_path.name, metadata['Title'], metadata['Keywords'],
+                          metadata['Category ID'], folder_path)
+
+                vector_row = dict(metadata)
+                vector_row["Filename"] = vector_path.name
+                vector_rows[vector_base_name] = vector_row
+                registrar_no_catalogo(folder_path, vector_row)
+
+                with open(processed_log_path, 'a') as f:
+                    f.write(f"{vector_path.name}\\n")
+                print(f"    -> Registrado {vector_path.name} no arquivo de log.")
+                added_count += 1
+
+        if added_count > 0:
+            print(f"\\n? Adicionados metadados para {added_count} arquivo(s) vetorial(is).")
         else:
-            vector_extensions = ('.svg', '.eps')
-            vector_files_found = [p for p in folder_path.iterdir() if p.suffix.lower() in vector_extensions]
-
-            added_count = 0
-            for vector_path in vector_files_found:
-                if vector_path.name in processed_files:
-                    print(f"  ? Ignorando arquivo vetorial já processado: {vector_path.name}")
-                    continue
-
-                vector_base_name = vector_path.stem
-                if vector_base_name in metadata_map:
-                    print(f"  ? Encontrada correspondência para: {vector_path.name}")
-                    metadata = metadata_map[vector_base_name]
-
-                    with open(csv_path, mode='a', newline='', encoding='utf-8') as f:
-                        writer = csv.writer(f)
-                        writer.writerow([
-                            vector_path.name,
-                            metadata['Title'],
-                            metadata['Keywords'],
-                            metadata['Category ID']
-                        ])
-                    print(f"    -> Metadados para {vector_path.name} salvos em {csv_path}")
-
-                    with open(processed_log_path, 'a') as f:
-                        f.write(f"{vector_path.name}\\n")
-                    print(f"    -> Registrado {vector_path.name} no arquivo de log.")
-                    added_count += 1
-
-            if added_count > 0:
-                print(f"\\n? Adicionados metadados para {added_count} arquivo(s) vetorial(is).")
-            else:
-                print("  - Nenhum novo arquivo vetorial correspondente encontrado para processar.")
+            print("  - Nenhum novo arquivo vetorial correspondente encontrado para processar.")
 
     # === Exports externos (Freepik/Dreamstime) a partir da resposta da API ===
     try:
@@ -593,10 +1522,11 @@ def main():
         else:
             base_rows = list(API_ROWS)
             if not base_rows:
-                date_str = datetime.now().strftime("%Y-%m-%d")
-                csv_file_name = f"adobe_metadata_{date_str}.csv"
-                csv_path = folder_path / csv_file_name
-                if csv_path.exists():
+                if CATALOG is not None:
+                    base_rows = CATALOG.rows_for(folder=folder_path, date_from=date_str, date_to=date_str)
+                    if not base_rows:
+                        print("?? Sem API_ROWS e sem linhas do dia no catálogo; nada para exportar.")
+                elif csv_path.exists():
                     with open(csv_path, newline="", encoding="utf-8") as f:
                         dr = csv.DictReader(f)
                         for r in dr:
@@ -614,39 +1544,51 @@ def main():
                     print("?? Sem API_ROWS e sem CSV master do dia; nada para exportar.")
 
             final_rows = []
-            if base_rows:
-                from pathlib import Path as _Path
-                vector_exts = {'.svg', '.eps'}
-                by_stem = {}
-                for r in base_rows:
-                    fn = r.get("Filename", "")
-                    if fn:
-                        by_stem[_Path(fn).stem] = r
-                seen_stems = set()
-                for p in folder_path.iterdir():
-                    if p.suffix.lower() in vector_exts:
-                        stem = p.stem
-                        base = by_stem.get(stem)
-                        if base:
-                            clone = dict(base)
-                            clone["Filename"] = p.name
-                            final_rows.append(clone)
-                            seen_stems.add(stem)
-                for stem, r in by_stem.items():
-                    if stem not in seen_stems:
-                        final_rows.append(r)
+            if base_rows or vector_rows:
+                final_rows = montar_linhas_export(base_rows, folder_path, extra_by_stem=vector_rows)
 
             if final_rows:
-                stem = datetime.now().strftime("%Y-%m-%d")
-                export_from_rows(final_rows, outdir=folder_path,
-                                 targets=['freepik', 'dreamstime'],
-                                 config_path=None, master_stem=stem)
+                with perfil("export_from_rows", always=True):
+                    export_from_rows(final_rows, outdir=folder_path,
+                                     targets=['freepik', 'dreamstime'],
+                                     config_path=None, master_stem=date_str)
                 print("?? Exports gerados (freepik/dreamstime).")
             else:
                 print("?? Nada para exportar.")
     except Exception as e:
         print(f"?? Falha ao gerar exports externos: {e}")
 
+    if CATALOG is not None:
+        CATALOG.close()
+
+    if GEMINI_PROMPT_CACHE is not None:
+        GEMINI_PROMPT_CACHE.close()
+
+    if USAGE_TOTALS["requests"]:
+        input_tokens = USAGE_TOTALS["input_tokens"]
+        cached_tokens = USAGE_TOTALS["cached_tokens"]
+        cached_pct = (100.0 * cached_tokens / input_tokens) if input_tokens else 0.0
+        print(f"?? Tokens em {USAGE_TOTALS['requests']} requisição(ões): entrada {input_tokens} "
+              f"(em cache {cached_tokens}, {cached_pct:.1f}%), saída {USAGE_TOTALS['output_tokens']}.")
+    if USAGE_TOTALS["unreported"]:
+        print(f"?? {USAGE_TOTALS['unreported']} requisição(ões) sem contagem de tokens informada pelo provedor "
+              f"(ex.: streaming OpenAI encerrado em </METADATA>); não entram nos totais.")
+
+    if controller is not None:
+        stats = controller.summary()
+        avg_latency = f"{stats['ewma_latency']:.1f}s" if stats['ewma_latency'] is not None else "n/d"
+        print(f"?? Concorrência adaptativa: janela final {stats['window']} (pico {stats['peak']}, "
+              f"teto {stats['maximum']}); {stats['increases']} aumento(s), {stats['decreases']} redução(ões), "
+              f"{stats['throttles']} throttle(s), {stats['latency_spikes']} pico(s) de latência, "
+              f"latência média {avg_latency}.")
+
+    if PROFILER is not None:
+        outputs = PROFILER.finish()
+        print(f"?? Perfil salvo em {outputs['report'].parent}:")
+        for label, path in outputs.items():
+            if path is not None:
+                print(f"  -> {label}: {path}")
+
     print("?? Processo finalizado.")
 
 if __name__ == "__main__":
@@ -2,9 +2,62 @@ import xbot
 import xbot_visual
 from . import package
 from .package import variables as glv
+import os
 import time
 from xbot import print
 
+# Tempos máximos (segundos) das esperas por prontidão; cada espera termina assim que a condição é atendida
+TIMEOUT_PAGINA = 20
+TIMEOUT_VETORIZACAO = 120
+TIMEOUT_PALETA = 30
+TIMEOUT_DOWNLOAD = 60
+INTERVALO_POLLING = 0.5
+EXTENSOES_DOWNLOAD_PARCIAL = (".crdownload", ".tmp", ".part")
+
+# Erros de programação (método inexistente, assinatura errada) não são falhas de prontidão da página
+ERROS_DE_PROGRAMACAO = (AttributeError, TypeError, NameError)
+
+def aguardar_condicao(condicao, timeout, intervalo=INTERVALO_POLLING):
+    """Consulta `condicao()` até ela retornar verdadeiro ou o tempo acabar; devolve se foi atendida.
+
+    Falhas ao localizar o elemento contam como "ainda não pronto" e a primeira delas é registrada;
+    erros de programação são propagados na hora em vez de virarem um timeout.
+    """
+    limite = time.monotonic() + float(timeout)
+    primeiro_erro = None
+    while True:
+        try:
+            if condicao():
+                return True
+        except ERROS_DE_PROGRAMACAO:
+            raise
+        except Exception as e:
+            if primeiro_erro is None:
+                primeiro_erro = e
+                print(f"Aguardando condição; falha ao consultar: {type(e).__name__}: {e}")
+        if time.monotonic() >= limite:
+            return False
+        time.sleep(intervalo)
+
+def aguardar_elemento(web_page, nome_seletor, timeout):
+    """Espera o elemento do seletor ficar visível na página."""
+    seletor = package.selector(nome_seletor)
+    return aguardar_condicao(lambda: web_page.is_element_displayed(seletor), timeout)
+
+def listar_arquivos(pasta):
+    return set(os.listdir(pasta))
+
+def aguardar_download(pasta, arquivos_antes, timeout):
+    """Espera surgir na pasta um arquivo novo e já concluído (sem extensão de download parcial)."""
+    def concluido():
+        novos = listar_arquivos(pasta) - arquivos_antes
+        return bool(novos) and not any(n.lower().endswith(EXTENSOES_DOWNLOAD_PARCIAL) for n in novos)
+    return aguardar_condicao(concluido, timeout)
+
+def carregar_controle(conteudo):
+    """Converte o conteúdo do arquivo de controle em um conjunto de caminhos já processados."""
+    return {linha.strip() for linha in (conteudo or "").splitlines() if linha.strip()}
+
 def main(args):
     try:
         pastaImagens = xbot_visual.programing.variable(value="E:\\trampo\\vender nas microsstock\\artes___\\2025\\setembro\\30_09_2025\\image_to_vector"
@@ -21,35 +74,46 @@ def main(args):
         listaDeFicheiros = xbot_visual.dir.find_files(path=pastaImagens, patterns="*.jpeg*", find_subdir=False, skip_hidden_file=False, is_sort=False, sort_by="name", sort_way="increase", _block=("main", 9, "Get list of files in folder"))
         xbot_visual.dialog.show_notifycation(operation_kind="show", level="info", placement="top", message=arquivoControle, timeout="3", _block=("main", 10, "Display notification"))
         xbot_visual.programing.sleep(random_number=False, seconds="1", start_number="1", stop_number="5", _block=("main", 11, "Wait"))
+        # Lista de controle lida uma única vez; novas entradas são acrescentadas ao conjunto e ao arquivo
+        processados = carregar_controle(xbot_visual.file.read(path=arquivoControle, read_way="all_text", encoding="UTF-8", _block=("main", 13, "Read file")))
         for loop_item in xbot_visual.workflow.list_iterator(list=listaDeFicheiros, loop_start_index="0", loop_end_index="-1", output_with_index=False, _block=("main", 12, "For each item in list")):
-            conteudoArquivoControle = xbot_visual.file.read(path=arquivoControle, read_way="all_text", encoding="UTF-8", _block=("main", 13, "Read file"))
-            if xbot_visual.workflow.test(operand1=conteudoArquivoControle, operator="not in", operand2=loop_item, operator_options="{\"ignoreCase\":\"False\"}", _block=("main", 14, "If")):
+            if loop_item not in processados:
                 xbot_visual.web.browser.navigate(browser=web_page, mode="url", url="https://pt.vectorizer.ai/", ignore_cache=False, load_timeout="20", _block=("main", 15, "Navigate to new URL"))
-                xbot_visual.programing.sleep(random_number=False, seconds="1", start_number="1", stop_number="5", _block=("main", 16, "Wait"))
+                if not aguardar_elemento(web_page, "selecionarPasta", TIMEOUT_PAGINA):
+                    print(f"Página não carregou em {TIMEOUT_PAGINA}s; pulando {loop_item}")
+                    continue
                 xbot_visual.web.element.upload(browser=web_page, element=package.selector("selecionarPasta"), file_name=loop_item, simulate=False, clipboard_input=False, input_type="automatic", wait_dialog_appear_timeout="20", force_ime_ENG=False, send_key_delay="50", focus_timeout="1000", _block=("main", 17, "Upload file(s)"))
-                xbot_visual.programing.sleep(random_number=False, seconds="20", start_number="1", stop_number="5", _block=("main", 18, "Wait"))
+                elemento_pronto = "SeletorPaleta" if remove_fundo else "FAÇA DOWNLOAD_2"
+                if not aguardar_elemento(web_page, elemento_pronto, TIMEOUT_VETORIZACAO):
+                    print(f"Vetorização não concluiu em {TIMEOUT_VETORIZACAO}s; pulando {loop_item}")
+                    continue
                 if xbot_visual.workflow.test(operand1=remove_fundo, operator="is true", operand2="", operator_options="{}", _block=("main", 19, "If")):
                     xbot_visual.web.element.click(browser=web_page, element=package.selector("SeletorPaleta"), simulate=True, move_mouse=False, clicks="click", button="left", keys="null", delay_after="1", anchor_type="center", sudoku_part="MiddleCenter", offset_x="0", offset_y="0", timeout="20", _block=("main", 20, "Click Element (web)"))
-                    xbot_visual.programing.sleep(random_number=False, seconds="8", start_number="1", stop_number="5", _block=("main", 21, "Wait"))
+                    aguardar_elemento(web_page, "Olho", TIMEOUT_PALETA)
                     xbot_visual.win32.click_mouse(is_move_mouse_before_click=True, point_x="63", point_y="510", relative_to="screen", move_speed="middle", button="left", click_type="click", hardware_driver_click=False, keys="null", delay_after="1", _block=("main", 22, "Click mouse"))
                     xbot_visual.programing.sleep(random_number=False, seconds="1", start_number="1", stop_number="5", _block=("main", 23, "Wait"))
                     xbot_visual.web.element.click(browser=web_page, element=package.selector("Olho"), simulate=True, move_mouse=False, clicks="click", button="left", keys="null", delay_after="1", anchor_type="center", sudoku_part="MiddleCenter", offset_x="0", offset_y="0", timeout="20", _block=("main", 24, "Click Element (web)"))
                     xbot_visual.web.element.click(browser=web_page, element=package.selector("bt_v_azul"), simulate=True, move_mouse=False, clicks="click", button="left", keys="null", delay_after="1", anchor_type="center", sudoku_part="MiddleCenter", offset_x="0", offset_y="0", timeout="20", _block=("main", 25, "Click Element (web)"))
-                    xbot_visual.programing.sleep(random_number=False, seconds="10", start_number="1", stop_number="5", _block=("main", 26, "Wait"))
+                    if not aguardar_elemento(web_page, "FAÇA DOWNLOAD_2", TIMEOUT_VETORIZACAO):
+                        print(f"Remoção de fundo não concluiu em {TIMEOUT_VETORIZACAO}s; pulando {loop_item}")
+                        continue
                 #endif
-                xbot_visual.programing.sleep(random_number=False, seconds="5", start_number="1", stop_number="5", _block=("main", 28, "Wait"))
                 xbot_visual.web.element.click(browser=web_page, element=package.selector("FAÇA DOWNLOAD_2"), simulate=True, move_mouse=False, clicks="click", button="left", keys="null", delay_after="1", anchor_type="center", sudoku_part="MiddleCenter", offset_x="0", offset_y="0", timeout="20", _block=("main", 29, "Click Element (web)"))
-                xbot_visual.programing.sleep(random_number=False, seconds="8", start_number="1", stop_number="5", _block=("main", 30, "Wait"))
+                aguardar_elemento(web_page, "FAÇA DOWNLOAD_4", TIMEOUT_PAGINA)
                 # web.element.click
                 # programing.sleep
                 # web.element.click
                 # programing.sleep
+                arquivos_antes = listar_arquivos(pastaImagens)
                 xbot_visual.web.element.click(browser=web_page, element=package.selector("FAÇA DOWNLOAD_4"), simulate=True, move_mouse=False, clicks="click", button="left", keys="null", delay_after="2", anchor_type="center", sudoku_part="MiddleCenter", offset_x="0", offset_y="0", timeout="20", _block=("main", 35, "Click Element (web)"))
                 # win32.click_mouse
-                xbot_visual.programing.sleep(random_number=False, seconds="2", start_number="1", stop_number="5", _block=("main", 37, "Wait"))
                 download_file_name = xbot_visual.web.handle_save_dialog(web_type="chrome", dialog_result="OK", file_folder=pastaImagens, use_custom_filename=False, file_name=None, wait_complete=False, wait_complete_timeout="", simulate=False, clipboard_input=False, input_type="automatic", wait_appear_timeout="20", force_ime_ENG=False, send_key_delay="50", focus_timeout="1000", _block=("main", 38, "Handle download dialog"))
+                if not aguardar_download(pastaImagens, arquivos_antes, TIMEOUT_DOWNLOAD):
+                    print(f"Download não concluiu em {TIMEOUT_DOWNLOAD}s; pulando {loop_item}")
+                    continue
                 random_number = xbot_visual.programing.random_int(start_number="4", stop_number="9", _block=("main", 39, "Generate random number"))
                 xbot_visual.file.write(path=arquivoControle, content=lambda: loop_item + '\n', write_way="append", is_text=True, new_line=False, encoding="UTF-8", _block=("main", 40, "Write to file"))
+                processados.add(loop_item)
                 xbot_visual.programing.sleep(random_number=False, seconds=random_number, start_number="1", stop_number="5", _block=("main", 41, "Wait"))
             #endif
         #endloop
@@ -0,0 +1,122 @@
+from __future__ import annotations
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+# Colunas no mesmo formato das linhas aceitas por exporters_core.export_from_rows
+ROW_FIELDS = [
+    "Filename", "Title", "Description", "Keywords", "Category ID",
+    "Releases", "DT_Category2", "DT_Category3",
+]
+_COLUMNS = {
+    "Filename": "filename",
+    "Title": "title",
+    "Description": "description",
+    "Keywords": "keywords",
+    "Category ID": "category_id",
+    "Releases": "releases",
+    "DT_Category2": "dt_category2",
+    "DT_Category3": "dt_category3",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    folder TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    stem TEXT NOT NULL,
+    title TEXT,
+    description TEXT,
+    keywords TEXT,
+    category_id TEXT,
+    releases TEXT,
+    dt_category2 TEXT,
+    dt_category3 TEXT,
+    provider TEXT,
+    model TEXT,
+    created_date TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_metadata_stem ON metadata (stem);
+CREATE INDEX IF NOT EXISTS idx_metadata_filename ON metadata (filename);
+CREATE INDEX IF NOT EXISTS idx_metadata_folder_date ON metadata (folder, created_date);
+"""
+
+
+def _folder_key(folder: Path) -> str:
+    return str(Path(folder).resolve())
+
+
+class MetadataCatalog:
+    """Catálogo SQLite persistente com todas as linhas de metadados geradas."""
+
+    def __init__(self, db_path: Path):
+        self.path = Path(db_path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def add_row(self, folder: Path, row: Dict[str, Any], provider: str = "", model: str = "") -> None:
+        filename = str(row.get("Filename", "") or "")
+        if not filename:
+            raise ValueError("Linha sem 'Filename' não pode ser catalogada.")
+        now = datetime.now()
+        values = [str(row.get(k, "") or "") for k in ROW_FIELDS]
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO metadata (folder, stem, provider, model, created_date, created_at, "
+                + ", ".join(_COLUMNS[k] for k in ROW_FIELDS)
+                + ") VALUES (?, ?, ?, ?, ?, ?, " + ", ".join("?" for _ in ROW_FIELDS) + ")",
+                [_folder_key(folder), Path(filename).stem, provider, model,
+                 now.strftime("%Y-%m-%d"), now.isoformat(timespec="seconds"), *values],
+            )
+            self._conn.commit()
+
+    def _to_row(self, rec: sqlite3.Row) -> Dict[str, Any]:
+        return {k: rec[_COLUMNS[k]] or "" for k in ROW_FIELDS}
+
+    def find_by_stem(self, stem: str, folder: Path) -> Optional[Dict[str, Any]]:
+        """Linha mais recente com o mesmo nome base na mesma pasta.
+
+        A busca não sai da pasta: nomes como `image_001` ou `Untitled-1` se repetem entre lotes
+        e casar com outra pasta atribuiria ao vetor os metadados de outra imagem.
+        """
+        with self._lock:
+            rec = self._conn.execute(
+                "SELECT * FROM metadata WHERE stem = ? AND folder = ? ORDER BY id DESC LIMIT 1",
+                (stem, _folder_key(folder)),
+            ).fetchone()
+        return self._to_row(rec) if rec else None
+
+    def rows_for(self, folder: Optional[Path] = None, date_from: Optional[str] = None,
+                 date_to: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Linhas de uma pasta e/ou intervalo de datas (YYYY-MM-DD), uma por arquivo (a mais recente)."""
+        clauses, params = [], []
+        if folder is not None:
+            clauses.append("folder = ?")
+            params.append(_folder_key(folder))
+        if date_from:
+            clauses.append("created_date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("created_date <= ?")
+            params.append(date_to)
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        sql = (
+            "SELECT * FROM metadata WHERE id IN ("
+            f"SELECT MAX(id) FROM metadata {where} GROUP BY folder, filename"
+            ") ORDER BY id"
+        )
+        with self._lock:
+            recs = self._conn.execute(sql, params).fetchall()
+        return [self._to_row(r) for r in recs]
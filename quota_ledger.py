@@ -0,0 +1,191 @@
+from __future__ import annotations
+import hashlib
+import importlib
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+except Exception:  # Python < 3.9 ou Windows sem o pacote tzdata
+    QUOTA_TZ = timezone(timedelta(hours=-8))
+
+# Pausa aplicada a uma chave após um 429 que não indica cota diária (limite por minuto)
+RATE_LIMIT_COOLDOWN = timedelta(seconds=60)
+
+# Último recurso para exceções sem status: um "quota" solto também aparece em 403 permanentes
+# (projeto de cota não configurado, faturamento), que não devem pausar a chave
+_QUOTA_ERROR = re.compile(r"\b429\b|resource[_ ]?exhausted|rate[_ ]?limit|insufficient_quota|too many requests",
+                          re.IGNORECASE)
+_DAILY_ERROR = re.compile(r"per[_ ]?day|perday|daily|insufficient_quota", re.IGNORECASE)
+
+
+def _optional_types(module_name: str, *names: str) -> tuple:
+    """Classes de exceção de um SDK opcional; tupla vazia se o pacote não estiver instalado."""
+    try:
+        module = importlib.import_module(module_name)
+    except Exception:
+        return ()
+    return tuple(t for t in (getattr(module, n, None) for n in names) if isinstance(t, type))
+
+
+# Exceções de limite de taxa/cota dos SDKs (todas correspondem a HTTP 429)
+RATE_LIMIT_EXCEPTIONS = (
+    _optional_types("openai", "RateLimitError")
+    + _optional_types("openai.error", "RateLimitError")
+    + _optional_types("google.api_core.exceptions", "TooManyRequests", "ResourceExhausted")
+)
+
+
+def is_quota_error(error: Any) -> bool:
+    """True se a falha é um HTTP 429 (cota ou limite de taxa).
+
+    Com status HTTP disponível, só 429 conta; o texto da mensagem é consultado apenas para
+    exceções sem status nem tipo conhecido.
+    """
+    for attr in ("status_code", "http_status", "code"):
+        status = getattr(error, attr, None)
+        if isinstance(status, int) and 100 <= status < 600:
+            return status == 429
+    if RATE_LIMIT_EXCEPTIONS and isinstance(error, RATE_LIMIT_EXCEPTIONS):
+        return True
+    return bool(_QUOTA_ERROR.search(str(error)))
+
+
+def key_id(provider: str, api_key: str) -> str:
+    """Identificador estável da chave no ledger, sem gravar a chave em texto puro."""
+    return f"{provider}:{hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]}"
+
+
+class QuotaLedger:
+    """Ledger persistido em JSON com o consumo diário de cada chave de API.
+
+    O dia de cota segue o fuso do Pacífico, como nas cotas gratuitas do Gemini. `requests`
+    conta só as chamadas aceitas pelo provedor; falhas (inclusive 429 rejeitados) vão para `errors`.
+    """
+
+    def __init__(self, path: Path, provider: str, daily_limit: int = 0):
+        self.path = Path(path)
+        self.provider = provider
+        self.daily_limit = max(0, int(daily_limit or 0))
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            try:
+                with self.path.open("r", encoding="utf-8") as f:
+                    self._data = json.load(f) or {}
+            except (OSError, ValueError):
+                self._data = {}
+
+    @staticmethod
+    def now() -> datetime:
+        return datetime.now(QUOTA_TZ)
+
+    def quota_day(self, when: Optional[datetime] = None) -> str:
+        return (when or self.now()).strftime("%Y-%m-%d")
+
+    def next_reset(self, when: Optional[datetime] = None) -> datetime:
+        when = when or self.now()
+        tomorrow = (when + timedelta(days=1)).date()
+        return datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=QUOTA_TZ)
+
+    def _entry(self, api_key: str) -> Dict[str, Any]:
+        kid = key_id(self.provider, api_key)
+        entry = self._data.get(kid)
+        today = self.quota_day()
+        if entry is None or entry.get("day") != today:
+            previous = entry or {}
+            entry = {
+                "day": today,
+                "requests": 0,
+                "errors": 0,
+                "tokens": 0,
+                "unmetered": 0,
+                "last_error": previous.get("last_error", ""),
+                "last_error_at": previous.get("last_error_at", ""),
+                "blocked_until": previous.get("blocked_until", ""),
+            }
+            self._data[kid] = entry
+        return entry
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(self._data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def blocked_until(self, api_key: str) -> Optional[datetime]:
+        """Momento até o qual a chave deve ser evitada, ou None se estiver disponível."""
+        with self._lock:
+            entry = self._entry(api_key)
+            if self.daily_limit and entry["requests"] >= self.daily_limit:
+                return self.next_reset()
+            raw = entry.get("blocked_until")
+        if raw:
+            until = datetime.fromisoformat(raw).astimezone(QUOTA_TZ)
+            if until > self.now():
+                return until
+        return None
+
+    def requests_today(self, api_key: str) -> int:
+        with self._lock:
+            return self._entry(api_key)["requests"]
+
+    def record_success(self, api_key: str, tokens: Optional[int] = None) -> None:
+        """Registra uma chamada aceita; `tokens=None` indica que o provedor não informou o uso."""
+        with self._lock:
+            entry = self._entry(api_key)
+            entry["requests"] += 1
+            if tokens is None:
+                entry["unmetered"] = entry.get("unmetered", 0) + 1
+            else:
+                entry["tokens"] += int(tokens)
+            self._save()
+
+    def record_error(self, api_key: str, error: Any) -> bool:
+        """Registra a falha; devolve True se ela indicar cota/limite e a chave foi bloqueada."""
+        message = str(error)
+        is_quota = is_quota_error(error)
+        with self._lock:
+            entry = self._entry(api_key)
+            entry["errors"] = entry.get("errors", 0) + 1
+            entry["last_error"] = message[:300]
+            entry["last_error_at"] = self.now().isoformat(timespec="seconds")
+            if is_quota:
+                if _DAILY_ERROR.search(message):
+                    until = self.next_reset()
+                else:
+                    until = self.now() + RATE_LIMIT_COOLDOWN
+                entry["blocked_until"] = until.isoformat(timespec="seconds")
+            self._save()
+        return is_quota
+
+    def remaining(self, api_keys: List[str]) -> Optional[int]:
+        """Requisições restantes hoje somando as chaves disponíveis; None se o limite diário não é conhecido."""
+        if not self.daily_limit:
+            return None
+        total = 0
+        reset = self.next_reset()
+        for api_key in api_keys:
+            until = self.blocked_until(api_key)
+            if until is not None and until >= reset:
+                continue
+            total += max(0, self.daily_limit - self.requests_today(api_key))
+        return total
+
+    def pacing_interval(self, api_keys: List[str]) -> Optional[float]:
+        """Intervalo (s) entre requisições que distribui a cota restante até o reinício; None se desconhecido."""
+        remaining = self.remaining(api_keys)
+        if not remaining:
+            return None
+        return max(0.0, (self.next_reset() - self.now()).total_seconds()) / remaining
+
+    def snapshot(self, api_key: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._entry(api_key))
@@ -0,0 +1,81 @@
+from __future__ import annotations
+import gzip
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional
+
+ARCHIVE_NAME = "raw_responses.jsonl.gz"
+INDEX_NAME = "raw_responses.idx"
+
+
+class ResponseArchive:
+    """Arquivo append-only com as respostas brutas dos modelos de uma pasta.
+
+    Cada registro é uma linha JSON comprimida como um membro gzip independente, então o
+    arquivo continua legível com `gzip.open` e uma falha no meio de uma escrita perde no
+    máximo o último registro. O índice guarda `offset<TAB>tamanho<TAB>arquivo` de cada membro
+    para leitura direta de uma resposta sem descomprimir o restante.
+    """
+
+    def __init__(self, folder: Path):
+        self.folder = Path(folder)
+        self.path = self.folder / ARCHIVE_NAME
+        self.index_path = self.folder / INDEX_NAME
+        self._lock = threading.Lock()
+
+    def append(self, filename: str, response_text: str, provider: str = "", model: str = "",
+               usage: Optional[Dict[str, Any]] = None) -> None:
+        record = {
+            "filename": filename,
+            "provider": provider,
+            "model": model,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "usage": usage or {},
+            "response": response_text,
+        }
+        payload = gzip.compress((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        with self._lock:
+            with self.path.open("ab") as f:
+                offset = f.tell()
+                f.write(payload)
+            with self.index_path.open("a", encoding="utf-8") as idx:
+                idx.write(f"{offset}\t{len(payload)}\t{filename}\n")
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """Percorre todos os registros em ordem de gravação."""
+        if not self.path.exists():
+            return
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            except (EOFError, OSError):
+                # Último membro truncado (execução interrompida durante a escrita)
+                return
+
+    def latest_by_filename(self) -> Dict[str, Dict[str, Any]]:
+        latest: Dict[str, Dict[str, Any]] = {}
+        for record in self.iter_records():
+            latest[record["filename"]] = record
+        return latest
+
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Registro mais recente do arquivo, lido diretamente pelo índice."""
+        if not self.index_path.exists():
+            return None
+        found = None
+        with self.index_path.open("r", encoding="utf-8") as idx:
+            for line in idx:
+                parts = line.rstrip("\n").split("\t", 2)
+                if len(parts) == 3 and parts[2] == filename:
+                    found = (int(parts[0]), int(parts[1]))
+        if found is None:
+            return None
+        offset, length = found
+        with self.path.open("rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        return json.loads(gzip.decompress(data).decode("utf-8"))
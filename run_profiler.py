@@ -0,0 +1,298 @@
+from __future__ import annotations
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Intervalo entre amostras de pilha para o arquivo de flame graph (segundos)
+STACK_SAMPLE_INTERVAL = 0.01
+TOP_N = 25
+# A partir do 3.12 o cProfile usa sys.monitoring: um único perfil ativo por processo, cobrindo todas as threads
+CPROFILE_PROCESS_WIDE = sys.version_info >= (3, 12)
+# Alocações feitas pelo próprio profiler não entram no relatório. O filtro é aplicado às
+# diferenças agrupadas por linha, bem menores que os snapshots (filter_traces é Python puro)
+_OWN_FILES = {tracemalloc.__file__, __file__}
+# ru_maxrss vem em KB no Linux e em bytes no macOS
+_RU_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def _peak_rss() -> Optional[int]:
+    """Pico de memória residente do processo em bytes (inclui buffers nativos); None se indisponível."""
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RU_MAXRSS_UNIT
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        # peak_wset só existe no Windows; nas demais plataformas fica o RSS atual
+        return getattr(info, "peak_wset", info.rss)
+    return None
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class RunProfiler:
+    """Perfil de CPU e memória de uma execução, aplicado a cada N-ésimo arquivo.
+
+    Arquivos amostrados são medidos com cProfile, por amostragem de pilhas (formato colapsado
+    de flame graph) e por snapshots tracemalloc antes/depois de cada estágio instrumentado.
+    tracemalloc só enxerga alocações do Python: os buffers de pixels do Pillow e do OpenCV
+    ficam de fora, então cada estágio também registra quanto o pico de RSS do processo subiu.
+    Com um arquivo por vez, fora dos arquivos amostrados nada é medido e o custo fica
+    proporcional a 1/N.
+
+    tracemalloc é global ao processo, assim como o cProfile a partir do Python 3.12 (antes
+    disso há um perfil por thread, somados no fim). Com vários arquivos em paralelo, enquanto
+    algum arquivo amostrado estiver em andamento as demais threads também são medidas e os
+    picos/alocadores por estágio misturam threads; o relatório avisa quando isso aconteceu.
+    Para números limpos, use `--max-concurrency 1`. Se outra ferramenta de profiling já estiver
+    ativa, o arquivo segue medido só por amostragem de pilhas e tracemalloc.
+    """
+
+    def __init__(self, output_dir: Path, sample_every: int = 1):
+        self.output_dir = Path(output_dir)
+        self.sample_every = max(1, int(sample_every or 1))
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiles = []
+        self._files_seen = 0
+        self._files_sampled = 0
+        self._active = 0
+        self._max_active = 0
+        self._shared_profile = None
+        self._shared_users = 0
+        self._cprofile_unavailable = 0
+        self._stacks: Counter = Counter()
+        self._stage_calls: Counter = Counter()
+        self._stage_time: Dict[str, float] = defaultdict(float)
+        self._stage_peak: Dict[str, int] = defaultdict(int)
+        self._stage_net: Dict[str, int] = defaultdict(int)
+        self._stage_rss: Dict[str, int] = defaultdict(int)
+        self._rss_available = _peak_rss() is not None
+        self._allocators: Counter = Counter()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_stacks, name="run-profiler-sampler", daemon=True)
+        self._sampler.start()
+
+    def _sample_stacks(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(STACK_SAMPLE_INTERVAL):
+            if not self._active:
+                continue
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.reverse()
+                with self._lock:
+                    self._stacks[";".join(stack)] += 1
+
+    def _is_sampled(self) -> bool:
+        return getattr(self._local, "sampled", False)
+
+    def _begin_tracing(self) -> None:
+        with self._lock:
+            self._active += 1
+            self._max_active = max(self._max_active, self._active)
+            if self._active == 1:
+                tracemalloc.start()
+
+    def _end_tracing(self) -> None:
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                tracemalloc.stop()
+
+    @contextmanager
+    def file_scope(self):
+        """Delimita o processamento de um arquivo; só os N-ésimos arquivos são medidos."""
+        with self._lock:
+            self._files_seen += 1
+            sampled = (self._files_seen - 1) % self.sample_every == 0
+            if sampled:
+                self._files_sampled += 1
+        if not sampled:
+            yield
+            return
+
+        tracing = False
+        profiling = False
+        try:
+            self._begin_tracing()
+            tracing = True
+            self._local.sampled = True
+            profiling = self._enable_cprofile()
+            yield
+        finally:
+            if profiling:
+                self._disable_cprofile()
+            self._local.sampled = False
+            if tracing:
+                self._end_tracing()
+
+    def _enable_cprofile(self) -> bool:
+        """Liga o cProfile para o arquivo atual; devolve False se não foi possível."""
+        try:
+            if CPROFILE_PROCESS_WIDE:
+                with self._lock:
+                    if self._shared_users == 0:
+                        if self._shared_profile is None:
+                            self._shared_profile = cProfile.Profile()
+                            self._profiles.append(self._shared_profile)
+                        self._shared_profile.enable()
+                    self._shared_users += 1
+                return True
+            profile = getattr(self._local, "profile", None)
+            if profile is None:
+                profile = cProfile.Profile()
+                self._local.profile = profile
+                with self._lock:
+                    self._profiles.append(profile)
+            profile.enable()
+            return True
+        except ValueError:
+            # Outra ferramenta de profiling ativa (ex.: o processo já roda sob `python -m cProfile`)
+            with self._lock:
+                self._cprofile_unavailable += 1
+            return False
+
+    def _disable_cprofile(self) -> None:
+        if CPROFILE_PROCESS_WIDE:
+            with self._lock:
+                self._shared_users -= 1
+                if self._shared_users == 0:
+                    self._shared_profile.disable()
+            return
+        self._local.profile.disable()
+
+    @contextmanager
+    def track(self, stage: str, always: bool = False):
+        """Mede tempo e memória de um estágio dentro de um arquivo amostrado (ou sempre, se `always`)."""
+        own_tracing = False
+        if not self._is_sampled():
+            if not always:
+                yield
+                return
+            self._begin_tracing()
+            own_tracing = True
+
+        before = tracemalloc.take_snapshot()
+        base_current, _ = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        rss_before = _peak_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            rss_after = _peak_rss()
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            grown = [stat for stat in after.compare_to(before, "lineno")
+                     if stat.size_diff > 0 and stat.traceback[0].filename not in _OWN_FILES]
+            with self._lock:
+                self._stage_calls[stage] += 1
+                self._stage_time[stage] += elapsed
+                self._stage_peak[stage] = max(self._stage_peak[stage], peak - base_current)
+                self._stage_net[stage] += current - base_current
+                if rss_before is not None and rss_after is not None:
+                    self._stage_rss[stage] = max(self._stage_rss[stage], rss_after - rss_before)
+                for stat in grown:
+                    frame = stat.traceback[0]
+                    self._allocators[(stage, frame.filename, frame.lineno)] += stat.size_diff
+            if own_tracing:
+                self._end_tracing()
+
+    def finish(self) -> Dict[str, Any]:
+        """Encerra a amostragem e grava os relatórios; devolve os caminhos gerados."""
+        self._stop.set()
+        self._sampler.join(timeout=1)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        pstats_path = self.output_dir / "cprofile.pstats"
+        stacks_path = self.output_dir / "stacks.collapsed"
+        report_path = self.output_dir / "report.txt"
+
+        stats = None
+        for profile in self._profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            except TypeError:
+                # Perfil sem nenhuma chamada registrada
+                continue
+        if stats is not None:
+            stats.dump_stats(str(pstats_path))
+
+        with stacks_path.open("w", encoding="utf-8") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        out = io.StringIO()
+        out.write(f"Arquivos amostrados: {self._files_sampled} de {self._files_seen} "
+                  f"(1 a cada {self.sample_every})\n")
+        if self._max_active > 1:
+            global_tools = ("tracemalloc e cProfile cobriram" if self._shared_profile is not None
+                            else "tracemalloc cobriu")
+            out.write(f"Aviso: até {self._max_active} arquivos amostrados em paralelo; {global_tools} todas as "
+                      f"threads, então picos e alocadores por estágio misturam arquivos. Use --max-concurrency 1 "
+                      f"para números isolados.\n")
+        if self._cprofile_unavailable:
+            out.write(f"Aviso: cProfile indisponível em {self._cprofile_unavailable} arquivo(s) "
+                      f"(outra ferramenta de profiling ativa); medidos só por amostragem e tracemalloc.\n")
+        out.write("\n")
+        out.write("== Estágios ==\n")
+        out.write("pico e líquido vêm do tracemalloc e não contam buffers nativos (pixels do Pillow/OpenCV). "
+                  "+RSS máx. é o quanto o pico de memória residente do processo subiu durante o estágio, "
+                  "buffers nativos incluídos; fica em 0 se o estágio não superou um pico anterior.\n")
+        if not self._rss_available:
+            out.write("RSS indisponível nesta plataforma (instale psutil).\n")
+        out.write(f"{'estágio':<24}{'chamadas':>10}{'total (s)':>12}{'médio (s)':>12}"
+                  f"{'pico (MB)':>12}{'líquido méd. (KB)':>20}{'+RSS máx. (MB)':>16}\n")
+        for stage in sorted(self._stage_calls, key=lambda s: -self._stage_time[s]):
+            calls = self._stage_calls[stage]
+            rss = f"{self._stage_rss[stage] / 1048576:>16.2f}" if self._rss_available else f"{'-':>16}"
+            out.write(f"{stage:<24}{calls:>10}{self._stage_time[stage]:>12.3f}"
+                      f"{self._stage_time[stage] / calls:>12.3f}"
+                      f"{self._stage_peak[stage] / 1048576:>12.2f}"
+                      f"{self._stage_net[stage] / calls / 1024:>20.1f}{rss}\n")
+
+        out.write(f"\n== Top {TOP_N} alocadores (tracemalloc, soma dos aumentos por linha) ==\n")
+        for (stage, filename, lineno), size in self._allocators.most_common(TOP_N):
+            out.write(f"{size / 1024:>12.1f} KB  [{stage}] {filename}:{lineno}\n")
+
+        if stats is not None:
+            out.write(f"\n== Top {TOP_N} funções por tempo cumulativo (cProfile) ==\n")
+            stats.stream = out
+            stats.sort_stats("cumulative").print_stats(TOP_N)
+
+        report_path.write_text(out.getvalue(), encoding="utf-8")
+        return {
+            "pstats": pstats_path if stats is not None else None,
+            "stacks": stacks_path,
+            "report": report_path,
+        }
@@ -0,0 +1,38 @@
+import importlib.util
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+STANDINS = Path(__file__).resolve().parent / "standins"
+
+# xbot e xbot_visual só existem no runtime RPA; os stand-ins locais ocupam o lugar deles
+sys.path.insert(0, str(STANDINS))
+sys.path.insert(0, str(ROOT))
+
+
+def _load_rpa_main():
+    """Importa main.py como `rpa_flow.main`, com o pacote `package` do stand-in ao lado."""
+    pkg = types.ModuleType("rpa_flow")
+    pkg.__path__ = [str(STANDINS / "rpa_flow")]
+    sys.modules["rpa_flow"] = pkg
+    spec = importlib.util.spec_from_file_location("rpa_flow.main", ROOT / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def xbot_visual():
+    import xbot_visual as standin
+    standin.reset()
+    yield standin
+    standin.reset()
+
+
+@pytest.fixture
+def rpa_main(xbot_visual):
+    return _load_rpa_main()
@@ -0,0 +1,5 @@
+"""Stand-in do pacote gerado pelo editor RPA: seletores são identificados pelo próprio nome."""
+
+
+def selector(name):
+    return name
@@ -0,0 +1 @@
+"""Variáveis globais do fluxo (vazias no stand-in)."""
@@ -0,0 +1,2 @@
+"""Stand-in local do módulo `xbot` do runtime RPA, só com o que main.py usa."""
+from builtins import print  # noqa: F401
@@ -0,0 +1,168 @@
+"""Stand-in local do `xbot_visual` para exercitar o fluxo de main.py fora do runtime RPA.
+
+Só implementa as ações usadas pelo fluxo. A página do vectorizer é simulada por `FakeWebPage`:
+a navegação mostra o seletor de arquivo, o upload mostra o botão de download, o clique nele
+mostra o segundo botão e o diálogo de salvamento grava na pasta o nome configurado em
+`DOWNLOADS` para o arquivo enviado.
+"""
+import fnmatch
+import os
+from types import SimpleNamespace
+
+# Valores devolvidos por programing.variable, por `_block` (substituem os do fluxo)
+OVERRIDES = {}
+# Arquivo enviado (nome base) -> nome gravado pelo diálogo de download; ausente = nenhum download
+DOWNLOADS = {}
+# Nomes base dos arquivos cuja vetorização nunca termina (o botão de download não aparece)
+VECTORIZE_FAILS = set()
+CALLS = []
+PAGE = None
+
+
+def reset():
+    global PAGE
+    OVERRIDES.clear()
+    DOWNLOADS.clear()
+    VECTORIZE_FAILS.clear()
+    del CALLS[:]
+    PAGE = None
+
+
+def _call(name, **kwargs):
+    CALLS.append((name, kwargs))
+
+
+def sh_str(value):
+    return str(value)
+
+
+class FakeWebPage:
+    def __init__(self):
+        self.visible = set()
+        self.uploaded = None
+
+    def is_element_displayed(self, selector):
+        return selector in self.visible
+
+    def navigate(self):
+        self.visible = {"selecionarPasta"}
+        self.uploaded = None
+
+    def upload(self, file_name):
+        self.uploaded = os.path.basename(file_name)
+        self.visible = set() if self.uploaded in VECTORIZE_FAILS else {"FAÇA DOWNLOAD_2"}
+
+    def click(self, selector):
+        if selector == "FAÇA DOWNLOAD_2":
+            self.visible.add("FAÇA DOWNLOAD_4")
+
+
+def _variable(value=None, _block=None):
+    return OVERRIDES.get(_block, value)
+
+
+def _sleep(**kwargs):
+    _call("sleep", **kwargs)
+
+
+def _random_int(start_number="0", stop_number="0", _block=None):
+    return int(start_number)
+
+
+programing = SimpleNamespace(variable=_variable, sleep=_sleep, random_int=_random_int)
+
+
+def _if_exist(path, expect_exist="exist", _block=None):
+    exists = os.path.exists(path)
+    return exists if expect_exist == "exist" else not exists
+
+
+def _write(path, content="", write_way="overwrite", encoding="UTF-8", _block=None, **kwargs):
+    if callable(content):
+        content = content()
+    with open(path, "a" if write_way == "append" else "w", encoding=encoding) as f:
+        f.write(content)
+
+
+def _read(path, read_way="all_text", encoding="UTF-8", _block=None):
+    with open(path, "r", encoding=encoding) as f:
+        return f.read()
+
+
+file = SimpleNamespace(if_exist=_if_exist, write=_write, read=_read)
+
+
+def _find_files(path, patterns="*", _block=None, **kwargs):
+    return sorted(os.path.join(path, n) for n in os.listdir(path) if fnmatch.fnmatch(n, patterns))
+
+
+dir = SimpleNamespace(find_files=_find_files)
+
+
+def _show_notifycation(**kwargs):
+    _call("notify", **kwargs)
+
+
+dialog = SimpleNamespace(show_notifycation=_show_notifycation)
+
+
+def _list_iterator(list=(), _block=None, **kwargs):
+    return iter(list)
+
+
+def _test(operand1=None, operator="is true", _block=None, **kwargs):
+    if operator == "is true":
+        return bool(operand1)
+    raise NotImplementedError(operator)
+
+
+workflow = SimpleNamespace(list_iterator=_list_iterator, test=_test)
+
+
+def _create(**kwargs):
+    global PAGE
+    PAGE = FakeWebPage()
+    return PAGE
+
+
+def _navigate(browser, url="", _block=None, **kwargs):
+    _call("navigate", url=url)
+    browser.navigate()
+
+
+def _upload(browser, element, file_name, _block=None, **kwargs):
+    _call("upload", file_name=file_name)
+    browser.upload(file_name)
+
+
+def _click(browser, element, _block=None, **kwargs):
+    _call("click", element=element)
+    browser.click(element)
+
+
+def _handle_save_dialog(web_type="chrome", file_folder="", _block=None, **kwargs):
+    uploaded = PAGE.uploaded if PAGE else None
+    name = DOWNLOADS.get(uploaded)
+    if name:
+        with open(os.path.join(file_folder, name), "w", encoding="utf-8") as f:
+            f.write("<svg/>")
+    return name
+
+
+web = SimpleNamespace(
+    create=_create,
+    browser=SimpleNamespace(navigate=_navigate),
+    element=SimpleNamespace(upload=_upload, click=_click),
+    handle_save_dialog=_handle_save_dialog,
+)
+
+
+def _move(**kwargs):
+    _call("move_window", **kwargs)
+
+
+def _click_mouse(**kwargs):
+    _call("click_mouse", **kwargs)
+
+
+win32 = SimpleNamespace(window=SimpleNamespace(move=_move), click_mouse=_click_mouse)
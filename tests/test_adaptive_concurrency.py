@@ -0,0 +1,39 @@
+from adaptive_concurrency import AIMDController, is_throttle_error
+
+
+class StatusError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def test_is_throttle_error_por_status():
+    assert is_throttle_error(StatusError("slow down", 429))
+    assert is_throttle_error(StatusError("bad gateway", 502))
+    assert not is_throttle_error(StatusError("quota project not set", 403))
+    assert not is_throttle_error(StatusError("model unavailable in your region", 400))
+
+
+def test_is_throttle_error_por_mensagem_so_com_codigo_explicito():
+    assert is_throttle_error(TimeoutError())
+    assert is_throttle_error(Exception("429 Resource has been exhausted"))
+    assert is_throttle_error(Exception("503 Service Unavailable"))
+    assert not is_throttle_error(Exception("Invalid value for field 'timeout'"))
+    assert not is_throttle_error(Exception("quota project not set"))
+    assert not is_throttle_error(Exception("model unavailable in your region"))
+
+
+def test_janela_cresce_ate_o_teto_e_cai_com_throttle():
+    controller = AIMDController(4)
+    for _ in range(50):
+        controller.record(1.0)
+    assert controller.limit == 4
+    controller.record(1.0, StatusError("too many", 429))
+    assert controller.limit == 2
+    assert controller.summary()["throttles"] == 1
+
+
+def test_erro_permanente_nao_reduz_janela():
+    controller = AIMDController(4, initial=4)
+    controller.record(1.0, StatusError("quota project not set", 403))
+    assert controller.limit == 4
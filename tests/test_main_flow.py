@@ -0,0 +1,101 @@
+import threading
+import time
+
+
+def test_carregar_controle_ignora_linhas_vazias_e_espacos(rpa_main):
+    conteudo = "  \nC:\\img\\a.jpeg\r\n\nC:\\img\\b.jpeg  \n"
+    assert rpa_main.carregar_controle(conteudo) == {"C:\\img\\a.jpeg", "C:\\img\\b.jpeg"}
+    assert rpa_main.carregar_controle(None) == set()
+
+
+def test_carregar_controle_nao_casa_prefixos(rpa_main):
+    processados = rpa_main.carregar_controle("C:\\img\\foto10.jpeg\n")
+    assert "C:\\img\\foto1.jpeg" not in processados
+
+
+def test_aguardar_condicao_retorna_assim_que_atendida(rpa_main):
+    chamadas = []
+
+    def condicao():
+        chamadas.append(1)
+        return len(chamadas) >= 3
+
+    inicio = time.monotonic()
+    assert rpa_main.aguardar_condicao(condicao, timeout=5, intervalo=0.01) is True
+    assert len(chamadas) == 3
+    assert time.monotonic() - inicio < 1
+
+
+def test_aguardar_condicao_respeita_timeout(rpa_main):
+    inicio = time.monotonic()
+    assert rpa_main.aguardar_condicao(lambda: False, timeout=0.2, intervalo=0.01) is False
+    decorrido = time.monotonic() - inicio
+    assert 0.2 <= decorrido < 1
+
+
+def test_aguardar_condicao_trata_falha_de_consulta_como_nao_pronto(rpa_main, capsys):
+    estado = {"n": 0}
+
+    def condicao():
+        estado["n"] += 1
+        if estado["n"] < 3:
+            raise RuntimeError("elemento não encontrado")
+        return True
+
+    assert rpa_main.aguardar_condicao(condicao, timeout=5, intervalo=0.01) is True
+    saida = capsys.readouterr().out
+    assert saida.count("elemento não encontrado") == 1
+
+
+def test_aguardar_condicao_propaga_erro_de_programacao(rpa_main):
+    class PaginaSemMetodo:
+        pass
+
+    pagina = PaginaSemMetodo()
+    inicio = time.monotonic()
+    try:
+        rpa_main.aguardar_condicao(lambda: pagina.is_element_displayed("x"), timeout=5, intervalo=0.01)
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("AttributeError deveria ter sido propagado")
+    assert time.monotonic() - inicio < 1
+
+
+def test_aguardar_download_ignora_arquivo_parcial(rpa_main, tmp_path):
+    (tmp_path / "existente.svg").write_text("x")
+    antes = rpa_main.listar_arquivos(tmp_path)
+    (tmp_path / "novo.svg.crdownload").write_text("x")
+    assert rpa_main.aguardar_download(tmp_path, antes, timeout=0.1) is False
+
+    def concluir():
+        time.sleep(0.05)
+        (tmp_path / "novo.svg.crdownload").rename(tmp_path / "novo.svg")
+
+    t = threading.Thread(target=concluir)
+    t.start()
+    assert rpa_main.aguardar_download(tmp_path, antes, timeout=2) is True
+    t.join()
+
+
+def test_fluxo_registra_apenas_arquivos_concluidos(rpa_main, xbot_visual, tmp_path, monkeypatch):
+    pasta = tmp_path / "imagens"
+    pasta.mkdir()
+    for nome in ("a.jpeg", "b.jpeg", "c.jpeg", "d.jpeg"):
+        (pasta / nome).write_text("x")
+    controle = tmp_path / "processados_automa.txt"
+    controle.write_text(str(pasta / "a.jpeg") + "\n", encoding="utf-8")
+
+    xbot_visual.OVERRIDES[("main", 1, "Set variable")] = str(pasta)
+    xbot_visual.OVERRIDES[("main", 3, "Set variable")] = str(controle)
+    xbot_visual.DOWNLOADS.update({"b.jpeg": "b.svg", "c.jpeg": "c.svg.crdownload", "d.jpeg": "d.svg"})
+    xbot_visual.VECTORIZE_FAILS.add("d.jpeg")
+    monkeypatch.setattr(rpa_main, "TIMEOUT_VETORIZACAO", 0.1)
+    monkeypatch.setattr(rpa_main, "TIMEOUT_DOWNLOAD", 0.1)
+
+    rpa_main.main([])
+
+    registrados = controle.read_text(encoding="utf-8").splitlines()
+    assert registrados == [str(pasta / "a.jpeg"), str(pasta / "b.jpeg")]
+    enviados = [c[1]["file_name"] for c in xbot_visual.CALLS if c[0] == "upload"]
+    assert enviados == [str(pasta / n) for n in ("b.jpeg", "c.jpeg", "d.jpeg")]
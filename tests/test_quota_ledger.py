@@ -0,0 +1,39 @@
+from quota_ledger import QuotaLedger, is_quota_error
+
+
+class StatusError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def test_is_quota_error_usa_status_quando_disponivel():
+    assert is_quota_error(StatusError("Resource has been exhausted", 429))
+    assert not is_quota_error(StatusError("quota project not set", 403))
+    assert not is_quota_error(StatusError("billing quota exceeded for project", 403))
+
+
+def test_is_quota_error_sem_status():
+    assert is_quota_error(Exception("429 Too Many Requests"))
+    assert is_quota_error(Exception("insufficient_quota"))
+    assert not is_quota_error(Exception("quota project not set"))
+    assert not is_quota_error(Exception("falha em foto_4290.jpg"))
+
+
+def test_falhas_nao_contam_como_requisicoes(tmp_path):
+    ledger = QuotaLedger(tmp_path / "ledger.json", "gemini", daily_limit=10)
+    ledger.record_error("k", StatusError("quota project not set", 403))
+    ledger.record_error("k", StatusError("rate limited", 429))
+    ledger.record_success("k", 100)
+    entry = ledger.snapshot("k")
+    assert entry["requests"] == 1
+    assert entry["errors"] == 2
+    assert ledger.remaining(["k"]) is not None
+
+
+def test_403_nao_bloqueia_a_chave(tmp_path):
+    ledger = QuotaLedger(tmp_path / "ledger.json", "gemini")
+    assert ledger.record_error("k", StatusError("quota project not set", 403)) is False
+    assert ledger.blocked_until("k") is None
+    assert ledger.record_error("k", StatusError("too many requests", 429)) is True
+    assert ledger.blocked_until("k") is not None